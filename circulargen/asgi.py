@@ -14,3 +14,18 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'circulargen.settings')
 
 application = get_asgi_application()
+
+# One long-lived event loop per process, so Gemini calls can use the SDK's
+# async client (see generator/llm.py).
+from generator import llm
+
+llm.native_async = True
+
+# Optionally load Gemini and WeasyPrint now rather than on the first request
+# (see circulargen/wsgi.py).
+from django.conf import settings
+
+if getattr(settings, 'CIRCULAR_WARM_UP', False):
+    from generator import pdf_engine
+    llm.warm_up()
+    pdf_engine.warm_up()
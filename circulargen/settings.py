@@ -2,7 +2,6 @@
 
 from pathlib import Path
 import os
-import google.generativeai as genai
 
 # ─────────────────────────────────────────────────────────────────────────────
 # 1. Base directory, secret, debug, hosts
@@ -27,6 +26,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'generator.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -128,3 +128,94 @@ EMAIL_USE_TLS      = True
 # ─────────────────────────────────────────────────────────────────────────────
 LOGIN_URL          = '/login/'
 LOGIN_REDIRECT_URL = '/'
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 11. PDF asset resolution (see generator/assets.py)
+# ─────────────────────────────────────────────────────────────────────────────
+CIRCULAR_ASSETS_ALLOW_REMOTE  = False            # only bundled logos/signatures by default
+CIRCULAR_ASSET_REMOTE_TIMEOUT = 5                # seconds, when remote fetching is enabled
+CIRCULAR_ASSET_CACHE_DIR      = BASE_DIR / 'asset_cache'
+CIRCULAR_ASSET_CACHE_BYTES    = 16 * 1024 * 1024
+CIRCULAR_ASSET_OPTIMIZE       = True             # downsample bundled images to their printed size
+CIRCULAR_ASSET_DPI            = 300              # print resolution the variants are built for
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 12. Background generation jobs (see generator/jobs.py)
+# ─────────────────────────────────────────────────────────────────────────────
+CIRCULAR_JOB_WORKERS     = 4                     # worker threads per process
+CIRCULAR_JOB_HEARTBEAT   = 30                    # seconds between refreshes of running jobs' claims
+CIRCULAR_JOB_STALE_AFTER = 300                   # seconds without a refresh before a running job is re-queued
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 13. Gemini response cache (see generator/llm_cache.py)
+# ─────────────────────────────────────────────────────────────────────────────
+CIRCULAR_LLM_CACHE_ENABLED = True
+CIRCULAR_LLM_CACHE_TTL     = 7 * 24 * 3600       # seconds
+CIRCULAR_LLM_CACHE_SIZE    = 256                 # in-memory entries per process
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 14. PDF rendering pool (see generator/pdf_engine.py)
+# ─────────────────────────────────────────────────────────────────────────────
+CIRCULAR_PDF_WORKERS      = None                 # None = one process per core, 0 = render in-process
+CIRCULAR_PDF_START_METHOD = 'spawn'
+CIRCULAR_PDF_QUALITY      = 'print'              # a name in pdf_engine.QUALITY_PROFILES, or a dict of write_pdf options
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 15. Batch generation (see generator/batch.py)
+# ─────────────────────────────────────────────────────────────────────────────
+CIRCULAR_BATCH_CONCURRENCY = 4                   # concurrent Gemini calls per batch (rate limited by the gateway)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 16. Email distribution (see generator/distribution.py)
+# ─────────────────────────────────────────────────────────────────────────────
+CIRCULAR_EMAIL_BATCH_SIZE  = 50                  # recipients per message
+CIRCULAR_EMAIL_RATE        = 2.0                 # messages per second
+CIRCULAR_EMAIL_STALE_AFTER = 300                 # seconds without progress before a send is re-queued
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 17. Streaming generation and DEMO-API-KEY mode (see generator/streaming.py)
+# ─────────────────────────────────────────────────────────────────────────────
+CIRCULAR_DEMO_STREAM_DELAY = 0.05                # seconds between simulated chunks (DEMO-API-KEY)
+CIRCULAR_DEMO_LLM_LATENCY  = 0.0                 # simulated Gemini latency in seconds (DEMO-API-KEY)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 18. Circular store (see generator/storage.py)
+# ─────────────────────────────────────────────────────────────────────────────
+CIRCULAR_PDF_ROOT       = BASE_DIR / 'generated_pdfs'
+CIRCULAR_RETENTION_DAYS = 365                    # used by `manage.py prune_circulars`
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 19. Instrumentation (see generator/instrumentation.py)
+# ─────────────────────────────────────────────────────────────────────────────
+CIRCULAR_PROFILE_SAMPLE_RATE = 0.0               # fraction of requests to run under cProfile (0 = off)
+CIRCULAR_PROFILE_SLOW_MS     = 2000              # keep a profile only if the request took at least this long
+CIRCULAR_PROFILE_DIR         = BASE_DIR / 'profiles'
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 20. Startup (see circulargen/wsgi.py, circulargen/asgi.py)
+# ─────────────────────────────────────────────────────────────────────────────
+CIRCULAR_WARM_UP = False                         # import Gemini/WeasyPrint when the WSGI/ASGI app loads
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 21. Gemini gateway (see generator/gateway.py)
+# ─────────────────────────────────────────────────────────────────────────────
+CIRCULAR_LLM_RATE              = 1.0             # calls per second, matched to the API quota
+CIRCULAR_LLM_BURST             = 5
+CIRCULAR_LLM_MAX_WAIT          = 10.0            # seconds to wait for quota before falling back
+CIRCULAR_LLM_TIMEOUT           = 60              # seconds per attempt
+CIRCULAR_LLM_RETRIES           = 2               # retries after the first attempt
+CIRCULAR_LLM_BACKOFF           = 0.5             # seconds; doubles per retry, with full jitter
+CIRCULAR_LLM_BACKOFF_MAX       = 8.0
+CIRCULAR_LLM_BREAKER_THRESHOLD = 5               # consecutive failures before the circuit opens
+CIRCULAR_LLM_BREAKER_RESET     = 30.0            # seconds before a probe call is allowed
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 22. Archive search (see generator/archive.py)
+# ─────────────────────────────────────────────────────────────────────────────
+CIRCULAR_ARCHIVE_PAGE_SIZE   = 20
+CIRCULAR_ARCHIVE_RANK_WINDOW = 1000              # broad queries rank only the newest N matches
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 23. Letterhead fragments (see generator/letterhead.py)
+# ─────────────────────────────────────────────────────────────────────────────
+CIRCULAR_LETTERHEAD_CHECK_INTERVAL = 2.0         # seconds between checks for edited fragment templates/assets
@@ -14,3 +14,15 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'circulargen.settings')
 
 application = get_wsgi_application()
+
+# Optionally load Gemini and WeasyPrint now rather than on the first request.
+# Under a pre-fork server with the app preloaded (gunicorn --preload) this runs
+# once in the master and the workers inherit it. The PDF pool itself has to
+# be started after the fork, e.g. from gunicorn's post_fork hook:
+#     from generator import pdf_engine; pdf_engine.warm_up(start_pool=True)
+from django.conf import settings
+
+if getattr(settings, 'CIRCULAR_WARM_UP', False):
+    from generator import llm, pdf_engine
+    llm.warm_up()
+    pdf_engine.warm_up()
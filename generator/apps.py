@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def repair_archive_index(sender, using, **kwargs):
+    from generator import archive
+    archive.ensure_index(using)
 
 
 class GeneratorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'generator'
+
+    def ready(self):
+        post_migrate.connect(repair_archive_index, sender=self)
@@ -0,0 +1,189 @@
+# generator/archive.py
+"""
+Full-text search over stored circulars.
+
+The index is the SQLite FTS5 table ``generator_circular_fts``, keyed by
+``circular_id``. Migration 0007 creates it along with triggers that keep it
+in step with the ``Circular`` table, so a circular is searchable as soon as
+it is saved, and again after every edit, whichever code path wrote it.
+SQLite drops a table's triggers when a migration rebuilds it, so
+``ensure_index`` re-creates them (and re-indexes) after every ``migrate``.
+
+Results are ranked by BM25, with subject, agenda and department matches
+weighted above matches in the body. Each result carries a highlighted
+subject and a snippet of the text around the match.
+
+Counting matches is cheap, but ranking costs time for every match. A query
+that matches most of a 100k-circular archive ("notice") would take ~100ms
+to rank. So only the newest ``CIRCULAR_ARCHIVE_RANK_WINDOW`` matches are
+ranked and paged. FTS5 applies that limit as a range of the index's own
+rowids, which follow the order circulars were indexed in; an edit re-indexes
+a circular, so it counts as new. The total count stays exact. With 100k circulars, a
+selective query takes about a millisecond and one matching half the
+archive takes 15-25ms.
+"""
+
+import re
+from functools import cached_property
+from importlib import import_module
+
+from django.conf           import settings
+from django.db             import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.utils.html     import escape
+from django.utils.safestring import mark_safe
+
+# Index columns, in table order: circular_id, subject, department, audience,
+# agenda, dates, text. circular_id is only indexed for the triggers' lookups.
+BM25_WEIGHTS = (0.0, 10.0, 5.0, 2.0, 5.0, 2.0, 1.0)
+TEXT_COLUMN  = 6
+
+# Match markers that cannot occur in circular text; swapped for <mark> after escaping.
+_OPEN, _CLOSE = '\x02', '\x03'
+
+# The migration that defines the index's schema and triggers.
+SCHEMA_MIGRATION = ('generator', '0007_archive_index_by_circular_id')
+
+
+def fts_query(query, department=None):
+    """
+    Turn free text into an FTS5 query that cannot be a syntax error.
+    Every word must match, after stemming ("exams" finds "exam"). A word
+    ending in ``*`` matches as a prefix ("sem*" finds "seminar"). Prefixes
+    are opt-in because they are several times slower to rank on a large
+    archive. Returns ``''`` if there is nothing to search.
+    """
+    words = re.findall(r'(\w+)(\*?)', query)
+    if not words:
+        return ''
+    terms = [f'"{word}"{star}' for word, star in words]
+    department = ' '.join(re.findall(r'\w+', department or ''))
+    if department:
+        terms.append(f'department : "{department}"')
+    return ' '.join(terms)
+
+
+def highlight(fragment):
+    """Escape an FTS5 snippet for HTML and turn its match markers into <mark> tags."""
+    return mark_safe(escape(fragment).replace(_OPEN, '<mark>').replace(_CLOSE, '</mark>'))
+
+
+class SearchResults:
+    """
+    Lazy, sliceable search results, so Django's ``Paginator`` can page them.
+    ``total`` is the number of matches; ``count()`` and paging cover the
+    ranked ones (at most ``window``). Only the requested slice is fetched.
+    """
+
+    def __init__(self, query, department=None, window=None):
+        self.query      = query
+        self.department = department
+        self.match      = fts_query(query, department)
+        self.window     = window or getattr(settings, 'CIRCULAR_ARCHIVE_RANK_WINDOW', 1000)
+
+    @cached_property
+    def total(self):
+        if not self.match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM generator_circular_fts WHERE generator_circular_fts MATCH %s",
+                [self.match],
+            )
+            return cursor.fetchone()[0]
+
+    @property
+    def truncated(self):
+        return self.total > self.window
+
+    def count(self):
+        return min(self.total, self.window)
+
+    def __len__(self):
+        return self.count()
+
+    def _window_clause(self):
+        """SQL and params restricting a query to the newest ``window`` matches."""
+        if not self.truncated:
+            return '', []
+        return (
+            """
+                   AND f.rowid >= (SELECT rowid FROM generator_circular_fts
+                                    WHERE generator_circular_fts MATCH %s
+                                    ORDER BY rowid DESC LIMIT 1 OFFSET %s)
+            """,
+            [self.match, self.window - 1],
+        )
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop  = self.count() if index.stop is None else min(index.stop, self.count())
+        if stop <= start:
+            return []
+
+        weights        = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+        window, params = self._window_clause()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT f.circular_id,
+                       c.department,
+                       c.created_at,
+                       json_extract(c.inputs, '$.date'),
+                       highlight(generator_circular_fts, 1, %s, %s),
+                       snippet(generator_circular_fts, {TEXT_COLUMN}, %s, %s, '…', 24),
+                       bm25(generator_circular_fts, {weights}) AS score
+                  FROM generator_circular_fts AS f
+                  JOIN generator_circular AS c ON c.circular_id = f.circular_id
+                 WHERE generator_circular_fts MATCH %s {window}
+                 ORDER BY score
+                 LIMIT %s OFFSET %s
+                """,
+                [_OPEN, _CLOSE, _OPEN, _CLOSE, self.match, *params, stop - start, start],
+            )
+            return [
+                {
+                    'circular_id': circular_id,
+                    'department':  department,
+                    'created_at':  created_at,
+                    'date':        date or '',
+                    'subject':     highlight(subject),
+                    'snippet':     highlight(snippet),
+                    'score':       round(-score, 3),
+                }
+                for circular_id, department, created_at, date, subject, snippet, score in cursor.fetchall()
+            ]
+
+
+def search(query, department=None):
+    return SearchResults(query, department)
+
+
+def ensure_index(using=DEFAULT_DB_ALIAS):
+    """
+    Re-create the index's triggers if any are missing, e.g. because a
+    migration rebuilt ``generator_circular``, and re-index every circular,
+    since writes made without them aren't in the index. Returns whether
+    anything was repaired. Run after every ``migrate`` (see generator/apps.py).
+    """
+    db = connections[using]
+    if db.vendor != 'sqlite' or SCHEMA_MIGRATION not in MigrationRecorder(db).applied_migrations():
+        return False
+    schema = import_module(f"generator.migrations.{SCHEMA_MIGRATION[1]}")
+    with db.cursor() as cursor:
+        cursor.execute(
+            f"SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN ({', '.join(['%s'] * len(schema.TRIGGERS))})",
+            list(schema.TRIGGERS),
+        )
+        if len(cursor.fetchall()) == len(schema.TRIGGERS):
+            return False
+        with transaction.atomic(using=using):
+            for name in schema.TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute("DELETE FROM generator_circular_fts")
+            cursor.execute(schema.REINDEX)
+            for sql in schema.TRIGGERS.values():
+                cursor.execute(sql)
+    return True
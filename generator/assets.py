@@ -0,0 +1,271 @@
+# generator/assets.py
+"""
+Local asset resolution for WeasyPrint.
+
+The circular templates reference the seal, the logo and the signatures by
+their public URLs so that the browser preview works anywhere. When rendering
+a PDF we map those URLs back to the copies shipped in
+``generator/static/generator`` and keep the bytes in a small in-process
+cache, so a render never waits on a third-party host. Those copies are
+downsampled to the size they are actually printed at (see section 4) the
+first time they are used, so every PDF and email attachment stays small. Fetching anything else
+over the network is opt-in (``CIRCULAR_ASSETS_ALLOW_REMOTE``) and goes
+through a timeout and an on-disk cache. ``file:`` URLs are only served from
+the bundled assets and ``STATIC_ROOT``.
+"""
+
+import hashlib
+import io
+import mimetypes
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlsplit
+from urllib.request import url2pathname
+
+from django.conf import settings
+
+from generator.storage import write_atomic
+
+ASSET_DIR = Path(__file__).resolve().parent / 'static' / 'generator'
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 1. Remote URL → bundled file mapping
+# ─────────────────────────────────────────────────────────────────────────────
+REMOTE_ASSET_MAP = {
+    'https://bapujidvg.in/logo/logo.jpg':                          'img/biet-seal.png',
+    'https://img.jagranjosh.com/images/2022/June/362022/BIET.png': 'img/BIET.png',
+}
+
+# Matches the GitHub blob/raw URLs of this repository as well as our own
+# ``/static/generator/...`` URLs, e.g. ".../generator/static/generator/signatures/CSE-sign.png".
+STATIC_PATH_RE = re.compile(r'/static/generator/((?:img|signatures)/[\w.\-]+)$')
+
+
+def resolve_local_asset(url):
+    """Return the bundled file for ``url``, or ``None`` if we don't ship one."""
+    relative = REMOTE_ASSET_MAP.get(url.split('?')[0])
+    if relative is None:
+        match = STATIC_PATH_RE.search(urlsplit(url).path)
+        if not match:
+            return None
+        relative = match.group(1)
+    path = (ASSET_DIR / relative).resolve()
+    return path if path.is_relative_to(ASSET_DIR) and path.is_file() else None
+
+
+def resolve_file_url(url):
+    """
+    The file a ``file:`` URL names, if it is one of the bundled assets or
+    under ``STATIC_ROOT``; ``None`` for anything else on disk.
+    """
+    path  = Path(url2pathname(urlsplit(url).path)).resolve()
+    roots = [ASSET_DIR] + ([Path(settings.STATIC_ROOT).resolve()] if getattr(settings, 'STATIC_ROOT', None) else [])
+    if any(path.is_relative_to(root) for root in roots) and path.is_file():
+        return path
+    return None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 2. Bounded in-process byte cache
+# ─────────────────────────────────────────────────────────────────────────────
+class AssetCache:
+    """Thread-safe LRU of asset bytes, bounded by total size."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items    = OrderedDict()
+        self._size     = 0
+        self._lock     = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+
+asset_cache = AssetCache(getattr(settings, 'CIRCULAR_ASSET_CACHE_BYTES', 16 * 1024 * 1024))
+
+
+def read_local_asset(path):
+    # Key on mtime so replacing a file on disk is picked up without a restart.
+    key  = (str(path), path.stat().st_mtime_ns)
+    data = asset_cache.get(key)
+    if data is None:
+        data = path.read_bytes()
+        asset_cache.put(key, data)
+    return data
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 3. Opt-in remote fetching with an on-disk cache
+# ─────────────────────────────────────────────────────────────────────────────
+def fetch_remote(url):
+    from weasyprint import default_url_fetcher
+
+    cache_dir  = Path(getattr(settings, 'CIRCULAR_ASSET_CACHE_DIR', settings.BASE_DIR / 'asset_cache'))
+    cache_path = cache_dir / hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    data = asset_cache.get(url)
+    if data is None and cache_path.is_file():
+        data = cache_path.read_bytes()
+    if data is None:
+        timeout = getattr(settings, 'CIRCULAR_ASSET_REMOTE_TIMEOUT', 5)
+        result  = default_url_fetcher(url, timeout=timeout)
+        if 'string' in result:
+            data = result['string']
+        else:
+            with result['file_obj'] as file_obj:
+                data = file_obj.read()
+        write_atomic(cache_path, data)
+    asset_cache.put(url, data)
+    return data
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 4. Print-optimized variants
+# ─────────────────────────────────────────────────────────────────────────────
+# Largest box (width, height in mm) each kind of bundled asset is printed at;
+# keep in step with generator/circular.css.
+PRINT_BOX_MM = {
+    'img':        (30, 20),     # .biet-header img: max-height 20mm, at most a 30mm column
+    'signatures': (60, 15),     # .signature-img: max-height 15mm, a third of the page width
+}
+
+OPTIMIZABLE_SUFFIXES = ('.png', '.jpg', '.jpeg')
+JPEG_QUALITY         = 85
+
+
+def optimize_image(data, box_mm, dpi):
+    """
+    Downsample image ``data`` to fit ``box_mm`` at ``dpi`` and recompress it.
+    Returns ``(bytes, suffix)``. Images with transparency stay PNG; opaque
+    ones become whichever of PNG and JPEG is smaller.
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    max_px = tuple(max(round(mm / 25.4 * dpi), 1) for mm in box_mm)
+    if image.width > max_px[0] or image.height > max_px[1]:
+        image.thumbnail(max_px, Image.LANCZOS)
+
+    png = io.BytesIO()
+    image.save(png, 'PNG', optimize=True)
+    candidates = [(png.getvalue(), '.png')]
+    if image.mode in ('RGB', 'L'):
+        jpeg = io.BytesIO()
+        image.save(jpeg, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        candidates.append((jpeg.getvalue(), '.jpg'))
+    return min(candidates, key=lambda candidate: len(candidate[0]))
+
+
+def _variant_dir():
+    return Path(getattr(settings, 'CIRCULAR_ASSET_CACHE_DIR', settings.BASE_DIR / 'asset_cache')) / 'variants'
+
+
+def _build_variant(path, box_mm, dpi):
+    source = path.read_bytes()
+    digest = hashlib.sha256(source + f"|{box_mm}|{dpi}|{JPEG_QUALITY}".encode('ascii')).hexdigest()[:16]
+    for existing in _variant_dir().glob(f"{path.stem}-{digest}.*"):
+        return existing.read_bytes()
+
+    data, suffix = optimize_image(source, box_mm, dpi)
+    if len(data) >= len(source):
+        data, suffix = source, path.suffix.lower()
+    variant_path = _variant_dir() / f"{path.stem}-{digest}{suffix}"
+    write_atomic(variant_path, data)
+    return data
+
+
+def _sniff_mime(data, path):
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if data[:2] == b'\xff\xd8':
+        return 'image/jpeg'
+    return mimetypes.guess_type(path.name)[0]
+
+
+def optimized_asset(path):
+    """
+    ``(bytes, mime_type)`` of the print-optimized variant of bundled ``path``.
+    Variants are built on first use and kept in ``CIRCULAR_ASSET_CACHE_DIR``;
+    ``CIRCULAR_ASSET_OPTIMIZE = False`` serves the originals.
+    """
+    box_mm = PRINT_BOX_MM.get(path.parent.name)
+    if (
+        box_mm is None
+        or path.suffix.lower() not in OPTIMIZABLE_SUFFIXES
+        or not getattr(settings, 'CIRCULAR_ASSET_OPTIMIZE', True)
+    ):
+        data = read_local_asset(path)
+        return data, _sniff_mime(data, path)
+
+    dpi  = getattr(settings, 'CIRCULAR_ASSET_DPI', 300)
+    key  = ('variant', str(path), path.stat().st_mtime_ns, dpi)
+    data = asset_cache.get(key)
+    if data is None:
+        data = _build_variant(path, box_mm, dpi)
+        asset_cache.put(key, data)
+    return data, _sniff_mime(data, path)
+
+
+def bundled_assets():
+    for kind in PRINT_BOX_MM:
+        yield from sorted((ASSET_DIR / kind).glob('*'))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 5. WeasyPrint url_fetcher
+# ─────────────────────────────────────────────────────────────────────────────
+def url_fetcher(url, timeout=10, ssl_context=None):
+    """Drop-in replacement for ``weasyprint.default_url_fetcher``."""
+    path = resolve_local_asset(url)
+    if path is not None:
+        data, mime_type = optimized_asset(path)
+        return {
+            'string':         data,
+            'mime_type':      mime_type,
+            'redirected_url': url,
+        }
+
+    if url.startswith(('http://', 'https://')):
+        if not getattr(settings, 'CIRCULAR_ASSETS_ALLOW_REMOTE', False):
+            raise ValueError(f"Remote asset fetching is disabled: {url}")
+        return {
+            'string':         fetch_remote(url),
+            'mime_type':      mimetypes.guess_type(urlsplit(url).path)[0],
+            'redirected_url': url,
+        }
+
+    if url.startswith('file:'):
+        # Templates only ever point at the bundled assets; never read other files.
+        path = resolve_file_url(url)
+        if path is None:
+            raise ValueError(f"Local file outside the static assets: {url}")
+        data = read_local_asset(path)
+        return {'string': data, 'mime_type': _sniff_mime(data, path), 'redirected_url': url}
+
+    from weasyprint import default_url_fetcher
+    return default_url_fetcher(url, timeout=timeout, ssl_context=ssl_context)
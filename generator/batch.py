@@ -0,0 +1,182 @@
+# generator/batch.py
+"""
+Bulk circular generation.
+
+A batch is a list of circular specs (the same fields as the index form)
+read from a CSV or JSON upload. A spec whose ``department`` is ``ALL`` or a
+comma-separated list is expanded into one circular per department.
+
+The Gemini calls fan out over ``CIRCULAR_BATCH_CONCURRENCY`` threads and
+are rate limited by the gateway (generator/gateway.py), like every other
+call. Each finished text is handed straight to the PDF pool, and the ZIP is
+written entry by entry as PDFs complete, so nothing is buffered beyond the
+entry being written. Under ASGI the view sends it through
+``streaming.aiterate``, since Django would otherwise collect it in full. Each
+circular is also stored like a single one, so it can be emailed later. A
+failed item is recorded in ``manifest.json`` and does not stop the batch.
+"""
+
+import csv
+import io
+import json
+import re
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db   import close_old_connections
+
+from generator                 import pipeline
+from generator.instrumentation import span
+from generator.pdf_engine      import submit_pdf
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 1. Reading specs
+# ─────────────────────────────────────────────────────────────────────────────
+def parse_specs(data, filename=''):
+    """Parse CSV or JSON bytes into a list of spec dicts."""
+    text = data.decode('utf-8-sig') if isinstance(data, bytes) else data
+    if filename.lower().endswith('.json') or text.lstrip().startswith(('[', '{')):
+        specs = json.loads(text)
+        if isinstance(specs, dict):
+            specs = specs.get('circulars', [specs])
+    else:
+        specs = list(csv.DictReader(io.StringIO(text)))
+
+    if not isinstance(specs, list) or not all(isinstance(s, dict) for s in specs):
+        raise ValueError("Expected a list of circular objects.")
+    return expand_departments(specs)
+
+
+def expand_departments(specs):
+    expanded = []
+    for spec in specs:
+        department = (spec.get('department') or '').strip()
+        if department.upper() == 'ALL':
+            codes = list(pipeline.HOD_BY_DEPT)
+        else:
+            codes = [code.strip().upper() for code in department.split(',') if code.strip()] or ['']
+        expanded.extend({**spec, 'department': code} for code in codes)
+    return expanded
+
+
+def _slug(value):
+    return re.sub(r'[^A-Za-z0-9]+', '_', value).strip('_')[:60] or 'circular'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 2. Running a batch
+# ─────────────────────────────────────────────────────────────────────────────
+def _generate(spec, use_cache):
+    """LLM stage for one item; runs on the batch thread pool."""
+    try:
+        inputs = pipeline.collect_inputs({'recipient_email': '', 'additional_info': '', **spec})
+        with span('prompt_build'):
+            prompt = pipeline.build_prompt(inputs)
+        with span('llm'):
+            circular = pipeline.generate_text(inputs, prompt, use_cache=use_cache)
+        return pipeline.build_context(inputs, circular, uuid.uuid4().hex[:8].upper())
+    finally:
+        close_old_connections()
+
+
+def _describe(exc):
+    if isinstance(exc, KeyError):
+        return f"Missing field {exc}"
+    return f"{type(exc).__name__}: {exc}"
+
+
+def run_batch(specs, base_url=None, use_cache=True):
+    """
+    Yield ``(manifest_entry, pdf_bytes)`` for every spec, in completion order.
+    ``pdf_bytes`` is ``None`` for items that failed.
+    """
+    concurrency = getattr(settings, 'CIRCULAR_BATCH_CONCURRENCY', 4)
+    executor    = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='circular-batch')
+
+    entries = {
+        index: {
+            'index':      index,
+            'subject':    spec.get('subject', ''),
+            'department': spec.get('department', ''),
+            'status':     'pending',
+        }
+        for index, spec in enumerate(specs, start=1)
+    }
+    contexts = {}
+    try:
+        # future -> (stage, index); LLM results are fed to the PDF pool as they arrive.
+        pending = {
+            executor.submit(_generate, spec, use_cache): ('llm', index)
+            for index, spec in enumerate(specs, start=1)
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, index = pending.pop(future)
+                entry = entries[index]
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    entry.pop('filename', None)
+                    entry.update(status='failed', error=_describe(exc))
+                    yield entry, None
+                    continue
+
+                if stage == 'llm':
+                    entry['circular_id'] = result['circular_id']
+                    entry['filename']    = f"{index:03d}_{_slug(result['department'])}_{_slug(result['subject'])}.pdf"
+                    contexts[index] = result
+                    pending[submit_pdf(result, base_url)] = ('pdf', index)
+                else:
+                    context = contexts.pop(index)
+                    inputs  = {field: context[field] for field in pipeline.INPUT_FIELDS}
+                    try:
+                        record = pipeline.save_circular(inputs, context['circular'], context['circular_id'])
+                        pipeline.attach_pdf(record, context, result)
+                    except Exception as exc:
+                        entry.pop('filename', None)
+                        entry.update(status='failed', error=_describe(exc))
+                        yield entry, None
+                        continue
+                    entry.update(status='ok', size=len(result))
+                    yield entry, result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 3. Streaming ZIP output
+# ─────────────────────────────────────────────────────────────────────────────
+class _ChunkSink:
+    """Write-only file object; ``zipfile`` writes into it and we drain it after each entry."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+def stream_zip(results):
+    """Turn ``run_batch`` output into an iterator of ZIP bytes, ending with manifest.json."""
+    sink     = _ChunkSink()
+    manifest = []
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for entry, pdf_bytes in results:
+            manifest.append(entry)
+            if pdf_bytes is not None:
+                archive.writestr(entry['filename'], pdf_bytes)
+                yield sink.drain()
+        manifest.sort(key=lambda item: item['index'])
+        archive.writestr('manifest.json', json.dumps(manifest, indent=2))
+    yield sink.drain()
@@ -0,0 +1,434 @@
+# generator/benchmark.py
+"""
+Offline end-to-end benchmarks for generate → render → email.
+
+Every scenario drives the real views through the Django test client against
+a throwaway database:
+
+* Gemini is replaced by the ``DEMO-API-KEY`` path, with
+  ``CIRCULAR_DEMO_LLM_LATENCY`` standing in for the network round-trip;
+* email goes over SMTP to an in-process sink on 127.0.0.1;
+* letterhead images resolve to the bundled static files (remote fetching
+  stays disabled, see generator/assets.py).
+
+Scenarios:
+
+``single``      POST /generate_circular/, then download its PDF.
+``batch``       POST /batch/ with ``batch_size`` specs and read the whole ZIP.
+``recipients``  POST /send-email/ to ``recipients`` addresses and wait until
+                every batch has been handed to the SMTP sink.
+
+``compare_asset_optimization`` reports the PDF size and render time of one
+circular before and after the letterhead image optimization
+(``CIRCULAR_ASSET_OPTIMIZE``, see generator/assets.py).
+
+Run with ``manage.py benchmark_circulars``; results are plain JSON so runs can
+be compared over time. generator/benchmark_test.py runs the same scenarios
+under pytest-benchmark.
+"""
+
+import io
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib         import contextmanager
+from datetime           import datetime, timezone
+
+import django
+from django.conf       import settings
+from django.db         import close_old_connections, connections
+from django.test       import Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+
+from generator        import llm, pdf_engine
+from generator.models import Circular, Distribution
+
+SCENARIOS = ('single', 'batch', 'recipients')
+
+FORM = {
+    'subject':         'Internal Assessment Schedule',
+    'date':            '01-08-2025',
+    'audience':        'All 3rd semester students',
+    'urgency':         'High',
+    'agenda':          'Second internal assessment',
+    'additional_info': 'Students must carry their ID cards.',
+    'venue':           'Main Block, Room 204',
+    'event_datetime':  '12-08-2025, 10:00 AM',
+    'department':      'CSE',
+    'recipient_email': 'hod.cse@example.edu',
+}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 1. Local SMTP sink
+# ─────────────────────────────────────────────────────────────────────────────
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for ``smtplib``: accepts and discards every message."""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+
+    def handle(self):
+        self.reply('220 localhost benchmark sink')
+        recipients = 0
+        for line in self.rfile:
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.reply('250 localhost')
+            elif command == b'MAIL':
+                recipients = 0
+                self.reply('250 OK')
+            elif command == b'RCPT':
+                recipients += 1
+                self.reply('250 OK')
+            elif command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                size = 0
+                for data in self.rfile:
+                    if data in (b'.\r\n', b'.\n'):
+                        break
+                    size += len(data)
+                self.server.record(recipients, size)
+                self.reply('250 OK')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            else:                       # RSET, NOOP, …
+                self.reply('250 OK')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads      = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.messages   = 0
+        self.recipients = 0
+        self.bytes      = 0
+        self._lock      = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def record(self, recipients, size):
+        with self._lock:
+            self.messages   += 1
+            self.recipients += recipients
+            self.bytes      += size
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 2. Measurements
+# ─────────────────────────────────────────────────────────────────────────────
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (which need not be sorted)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(values):
+    if not values:
+        return None
+    return {
+        'p50':  round(percentile(values, 50), 2),
+        'p95':  round(percentile(values, 95), 2),
+        'p99':  round(percentile(values, 99), 2),
+        'mean': round(sum(values) / len(values), 2),
+        'max':  round(max(values), 2),
+    }
+
+
+def _vm_hwm_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_kb():
+    """
+    Peak resident set size so far of this process and of the PDF worker
+    processes (Linux reports kilobytes). Peaks only grow over a run, so run
+    one scenario per invocation for isolated figures.
+    """
+    workers = 0
+    pool    = pdf_engine._pool
+    for process in (getattr(pool, '_processes', None) or {}).values():
+        workers += _vm_hwm_kb(process.pid) or 0
+    return {
+        'main':        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'pdf_workers': workers,
+    }
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result  = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 3. Scenarios
+# ─────────────────────────────────────────────────────────────────────────────
+_local = threading.local()
+
+
+def _client(user):
+    client = getattr(_local, 'client', None)
+    if client is None:
+        client = _local.client = Client()
+        client.force_login(user)
+    return client
+
+
+def _check(response, expected=200):
+    if response.status_code != expected:
+        raise RuntimeError(f"{response.request['PATH_INFO']} returned {response.status_code}")
+    return response
+
+
+def _read(response):
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+def _single(user, index, options):
+    client  = _client(user)
+    form    = {**FORM, 'subject': f"{FORM['subject']} #{index}"}
+    _, generate_ms = timed(lambda: _check(client.post('/generate_circular/', form)))
+    circular_id    = Circular.objects.get(subject=form['subject']).pk
+    pdf, pdf_ms    = timed(lambda: _read(_check(client.get(f'/circular/{circular_id}/pdf/'))))
+    return {'stages': {'generate': generate_ms, 'pdf': pdf_ms}, 'pdf_bytes': [len(pdf)]}
+
+
+def _batch(user, index, options):
+    client = _client(user)
+    specs  = [
+        {**FORM, 'subject': f"{FORM['subject']} #{index}.{n}"}
+        for n in range(options['batch_size'])
+    ]
+    upload = io.BytesIO(json.dumps(specs).encode('utf-8'))
+    upload.name = 'specs.json'
+    archive, batch_ms = timed(lambda: _read(_check(client.post('/batch/', {'specs': upload}))))
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        manifest = json.loads(zf.read('manifest.json'))
+    failed = [entry for entry in manifest if entry['status'] != 'ok']
+    if failed:
+        raise RuntimeError(f"{len(failed)} batch item(s) failed: {failed[0].get('error')}")
+    return {'stages': {'batch': batch_ms}, 'pdf_bytes': [entry['size'] for entry in manifest]}
+
+
+def _recipients(user, index, options):
+    client     = _client(user)
+    recipients = ', '.join(f"user{n}@example.edu" for n in range(options['recipients']))
+    response, request_ms = timed(lambda: _check(client.post('/send-email/', {
+        'circular_id':     options['circular_id'],
+        'recipient_email': recipients,
+    }), 302))
+    distribution_id = int(response.url.rstrip('/').rsplit('/', 1)[-1])
+
+    started  = time.perf_counter()
+    deadline = time.monotonic() + options['timeout']
+    final    = (Distribution.SENT, Distribution.PARTIAL, Distribution.FAILED)
+    while (status := Distribution.objects.get(pk=distribution_id).status) not in final:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"distribution {distribution_id} still {status}")
+        time.sleep(0.02)
+    if status != Distribution.SENT:
+        raise RuntimeError(f"distribution {distribution_id} finished as {status}")
+    delivery_ms = (time.perf_counter() - started) * 1000
+    return {'stages': {'request': request_ms, 'delivery': delivery_ms}}
+
+
+def _prepare_recipients(user, options):
+    # One circular, with its PDF already rendered, shared by every distribution.
+    form = {**FORM, 'subject': f"{FORM['subject']} (distribution)"}
+    _check(_client(user).post('/generate_circular/', form))
+    options['circular_id'] = Circular.objects.get(subject=form['subject']).pk
+    _read(_check(_client(user).get(f"/circular/{options['circular_id']}/pdf/")))
+
+
+RUNNERS = {'single': _single, 'batch': _batch, 'recipients': _recipients}
+
+
+def run_scenario(name, user, options):
+    """Run ``options['requests']`` iterations of scenario ``name`` over ``options['concurrency']`` clients."""
+    if name == 'recipients':
+        _prepare_recipients(user, options)
+    runner = RUNNERS[name]
+
+    def iteration(index):
+        try:
+            result, total_ms = timed(runner, user, index, options)
+            result['total'] = total_ms
+            return result
+        except Exception as exc:
+            return {'error': f"{type(exc).__name__}: {exc}"}
+        finally:
+            close_old_connections()
+
+    sink_before = (options['sink'].messages, options['sink'].recipients)
+    started     = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+        results = list(executor.map(iteration, range(options['requests'])))
+    wall_s = time.perf_counter() - started
+
+    ok     = [r for r in results if 'error' not in r]
+    errors = [r['error'] for r in results if 'error' in r]
+    stages = {}
+    for result in ok:
+        for stage, ms in result['stages'].items():
+            stages.setdefault(stage, []).append(ms)
+    pdf_sizes = [size for result in ok for size in result.get('pdf_bytes', ())]
+
+    report = {
+        'requests':       len(results),
+        'errors':         len(errors),
+        'error_samples':  errors[:5],
+        'concurrency':    options['concurrency'],
+        'wall_s':         round(wall_s, 3),
+        'throughput_rps': round(len(ok) / wall_s, 3) if wall_s else None,
+        'latency_ms':     summarize([r['total'] for r in ok]),
+        'stages_ms':      {stage: summarize(values) for stage, values in stages.items()},
+        'pdf_bytes':      {'mean': round(sum(pdf_sizes) / len(pdf_sizes)), 'max': max(pdf_sizes)} if pdf_sizes else None,
+        'peak_rss_kb':    peak_rss_kb(),
+    }
+    if name == 'batch':
+        report['circulars_per_s'] = round(len(pdf_sizes) / wall_s, 3) if wall_s else None
+    if name == 'recipients':
+        report['smtp'] = {
+            'messages':   options['sink'].messages - sink_before[0],
+            'recipients': options['sink'].recipients - sink_before[1],
+        }
+    return report
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 4. Environment
+# ─────────────────────────────────────────────────────────────────────────────
+@contextmanager
+def benchmark_environment(llm_latency, sink, email_rate=None, verbosity=0):
+    """
+    A throwaway on-disk SQLite database (so concurrent clients share it), the
+    demo Gemini path and the SMTP sink, all undone on exit.
+    """
+    db_dir     = tempfile.mkdtemp(prefix='circular-bench-')
+    connection = connections['default']
+    test_dict  = connection.settings_dict.setdefault('TEST', {})
+    saved_name = test_dict.get('NAME')
+    test_dict['NAME'] = os.path.join(db_dir, 'bench.sqlite3')
+
+    overrides = override_settings(
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+        EMAIL_HOST='127.0.0.1',
+        EMAIL_PORT=sink.port,
+        EMAIL_USE_TLS=False,
+        EMAIL_USE_SSL=False,
+        EMAIL_HOST_USER='',
+        EMAIL_HOST_PASSWORD='',
+        CIRCULAR_PDF_ROOT=os.path.join(db_dir, 'pdfs'),
+        CIRCULAR_DEMO_LLM_LATENCY=llm_latency,
+        CIRCULAR_EMAIL_RATE=email_rate or getattr(settings, 'CIRCULAR_EMAIL_RATE', 2.0),
+    )
+    saved_key = llm.api_key
+    old_config = setup_databases(verbosity, interactive=False, aliases={'default'})
+    overrides.enable()
+    llm.api_key = llm.DEMO_API_KEY
+    try:
+        yield
+    finally:
+        llm.api_key = saved_key
+        overrides.disable()
+        teardown_databases(old_config, verbosity)
+        test_dict['NAME'] = saved_name
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 5. Asset optimization, before and after
+# ─────────────────────────────────────────────────────────────────────────────
+def compare_asset_optimization(rounds=5):
+    """
+    Render the same circular in-process with ``CIRCULAR_ASSET_OPTIMIZE`` off
+    ("before") and on ("after"). Each side renders once untimed, so fonts and
+    the downscaled images are ready, then ``rounds`` timed renders.
+    """
+    from generator import pipeline
+
+    context = pipeline.build_context(FORM, pipeline.demo_text(FORM), 'BENCH001')
+    report  = {}
+    for label, optimize in (('before', False), ('after', True)):
+        with override_settings(CIRCULAR_PDF_WORKERS=0, CIRCULAR_ASSET_OPTIMIZE=optimize):
+            pdf     = pdf_engine.render_pdf(context)
+            timings = [timed(pdf_engine.render_pdf, context)[1] for _ in range(rounds)]
+        report[label] = {'pdf_bytes': len(pdf), 'render_ms': summarize(timings)}
+    report['size_ratio'] = round(report['after']['pdf_bytes'] / report['before']['pdf_bytes'], 3)
+    return report
+
+
+def run(scenarios=SCENARIOS, requests=20, concurrency=4, llm_latency=0.0,
+        batch_size=6, recipients=500, email_rate=None, timeout=300,
+        compare_assets=False):
+    """Run ``scenarios`` and return the JSON-serializable report."""
+    from django.contrib.auth.models import User
+
+    with SMTPSink() as sink, benchmark_environment(llm_latency, sink, email_rate):
+        user    = User.objects.create_user('benchmark')
+        options = {
+            'requests':    requests,
+            'concurrency': concurrency,
+            'batch_size':  batch_size,
+            'recipients':  recipients,
+            'timeout':     timeout,
+            'sink':        sink,
+        }
+        report = {
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python':     platform.python_version(),
+            'django':     django.get_version(),
+            'cpu_count':  os.cpu_count(),
+            'config': {
+                'requests':          requests,
+                'concurrency':       concurrency,
+                'llm_latency_s':     llm_latency,
+                'batch_size':        batch_size,
+                'recipients':        recipients,
+                'pdf_workers':       pdf_engine.pool_size(),
+                'email_batch_size':  getattr(settings, 'CIRCULAR_EMAIL_BATCH_SIZE', 50),
+                'email_rate':        settings.CIRCULAR_EMAIL_RATE,
+                'remote_assets':     getattr(settings, 'CIRCULAR_ASSETS_ALLOW_REMOTE', False),
+            },
+            'scenarios': {},
+        }
+        for name in scenarios:
+            report['scenarios'][name] = run_scenario(name, user, options)
+        if compare_assets:
+            report['asset_optimization'] = compare_asset_optimization()
+    return report
@@ -0,0 +1,61 @@
+# generator/benchmark_test.py
+"""
+The benchmark scenarios (generator/benchmark.py) under pytest-benchmark::
+
+    pytest generator/benchmark_test.py --benchmark-json=bench.json
+
+Each scenario runs as one round of ``run_scenario``. The scenario's own
+report (latency percentiles, per-stage timings, PDF sizes) is attached as
+``extra_info``, so pytest-benchmark can save and compare runs; so is the
+before/after report of ``compare_asset_optimization``. Django is set up by
+generator/conftest.py. The module is skipped when pytest-benchmark
+isn't installed or WeasyPrint can't load its native libraries (Pango). Its
+name keeps it out of ``manage.py test``, which only collects ``test*.py``.
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+# WeasyPrint raises OSError rather than ImportError when Pango is missing.
+try:
+    import weasyprint  # noqa: F401
+except (ImportError, OSError) as exc:
+    pytest.skip(f'WeasyPrint is unavailable: {exc}', allow_module_level=True)
+
+from django.contrib.auth.models import User
+
+from generator import benchmark as harness
+
+OPTIONS = {
+    'requests':    int(os.environ.get('CIRCULAR_BENCH_REQUESTS', 8)),
+    'concurrency': int(os.environ.get('CIRCULAR_BENCH_CONCURRENCY', 2)),
+    'batch_size':  3,
+    'recipients':  100,
+    'timeout':     120,
+}
+
+
+@pytest.fixture(scope='module')
+def environment():
+    with harness.SMTPSink() as sink, harness.benchmark_environment(0.0, sink):
+        yield User.objects.create_user('benchmark'), sink
+
+
+@pytest.mark.parametrize('scenario', harness.SCENARIOS)
+def test_scenario(benchmark, environment, scenario):
+    user, sink = environment
+    options    = {**OPTIONS, 'sink': sink}
+    report     = benchmark.pedantic(harness.run_scenario, args=(scenario, user, options), rounds=1, iterations=1)
+
+    benchmark.extra_info.update(report)
+    assert report['errors'] == 0, report['error_samples']
+
+
+def test_asset_optimization(benchmark):
+    report = benchmark.pedantic(harness.compare_asset_optimization, rounds=1, iterations=1)
+
+    benchmark.extra_info.update(report)
+    assert report['after']['pdf_bytes'] <= report['before']['pdf_bytes'], report
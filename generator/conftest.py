@@ -0,0 +1,14 @@
+# generator/conftest.py
+"""
+Django setup for the pytest-only modules (generator/benchmark_test.py). The
+unit tests in generator/tests.py run under ``manage.py test``.
+"""
+
+import os
+
+import django
+
+
+def pytest_configure(config):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'circulargen.settings')
+    django.setup()
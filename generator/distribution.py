@@ -0,0 +1,219 @@
+# generator/distribution.py
+"""
+Emailing a circular to a distribution list.
+
+Recipients are split into batches of ``CIRCULAR_EMAIL_BATCH_SIZE`` (one
+message per batch, so we stay under the provider's recipients-per-message
+limit). They are Bcc'd, so they don't see each other's addresses. All
+batches go over a single SMTP connection, at most ``CIRCULAR_EMAIL_RATE``
+messages per second. Sending happens on the background job pool, and the
+stored PDF is read once per distribution.
+
+Every recipient has a ``Delivery`` row, so a retry only resends what has not
+gone out yet. Over SMTP, the addresses the server refuses are taken from
+``sendmail``'s result, so each recipient gets its own status. Other
+backends (console, locmem, ...) only report whether the whole message was
+accepted, so there a batch succeeds or fails as a unit.
+
+A distribution is claimed with a conditional UPDATE before sending, as in
+generator/jobs.py, so a retry clicked mid-send can't start a second send.
+The sender refreshes the claim after every batch. One left sending or queued
+for ``CIRCULAR_EMAIL_STALE_AFTER`` seconds was lost with its process; the
+job heartbeat (``jobs.beat``) queues and sends it again, and a retry is
+accepted for it.
+"""
+
+import smtplib
+from datetime import timedelta
+
+from django.conf              import settings
+from django.core.mail         import EmailMessage, get_connection
+from django.core.mail.message import sanitize_address
+from django.db        import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils     import timezone
+
+from generator                 import pipeline, storage
+from generator.instrumentation import span
+from generator.jobs            import get_executor
+from generator.models          import Delivery, Distribution
+from generator.throttle        import TokenBucket
+
+EMAIL_BODY = "Dear recipient,\n\nPlease find attached the official circular.\n\nRegards,\nAdmin Office"
+
+
+def create(circular, subject, recipients):
+    with transaction.atomic():
+        distribution = Distribution.objects.create(circular=circular, subject=subject)
+        Delivery.objects.bulk_create(
+            Delivery(distribution=distribution, recipient=recipient)
+            for recipient in dict.fromkeys(recipients)      # de-duplicate, keep order
+        )
+    return distribution
+
+
+def _stale_cutoff():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'CIRCULAR_EMAIL_STALE_AFTER', 300))
+
+
+def submit(distribution):
+    """
+    Send (or resend) everything not yet delivered, off the request thread.
+    Returns ``False``, and does nothing, while the distribution is being sent.
+    """
+    queued = Distribution.objects.filter(
+        Q(pk=distribution.pk),
+        ~Q(status=Distribution.SENDING) | Q(updated_at__lt=_stale_cutoff()),
+    ).update(status=Distribution.QUEUED, updated_at=timezone.now())
+    if not queued:
+        return False
+    executor = get_executor()
+    transaction.on_commit(lambda: executor.submit(send, distribution.pk))
+    return True
+
+
+def requeue_stale():
+    """Queue again, and send, the distributions whose process died before finishing; returns how many."""
+    stale = Distribution.objects.filter(
+        status__in=[Distribution.QUEUED, Distribution.SENDING], updated_at__lt=_stale_cutoff()
+    )
+    ids   = list(stale.values_list('pk', flat=True))
+    count = stale.filter(pk__in=ids).update(status=Distribution.QUEUED, updated_at=timezone.now())
+    for distribution_id in ids:
+        get_executor().submit(send, distribution_id)
+    return count
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def send(distribution_id, connection=None):
+    try:
+        claimed = Distribution.objects.filter(pk=distribution_id, status=Distribution.QUEUED).update(
+            status=Distribution.SENDING, updated_at=timezone.now()
+        )
+        if not claimed:
+            return
+
+        distribution = Distribution.objects.get(pk=distribution_id)
+        deliveries   = list(distribution.deliveries.exclude(status=Delivery.SENT))
+        if not deliveries:
+            _finish(distribution)
+            return
+
+        circular = distribution.circular
+        try:
+            if circular is None:
+                raise FileNotFoundError("the circular has been deleted")
+            attachment = storage.read_pdf(pipeline.ensure_pdf(circular))
+        except Exception as exc:
+            Delivery.objects.filter(pk__in=[d.pk for d in deliveries]).update(
+                status=Delivery.FAILED, error=f"Attachment unavailable: {exc}"
+            )
+            distribution.status = Distribution.FAILED
+            distribution.save(update_fields=['status', 'updated_at'])
+            return
+
+        batch_size = max(getattr(settings, 'CIRCULAR_EMAIL_BATCH_SIZE', 50), 1)
+        throttle   = TokenBucket(getattr(settings, 'CIRCULAR_EMAIL_RATE', 2.0))
+        connection = connection or get_connection()
+        _open(connection)
+        try:
+            for batch in _batches(deliveries, batch_size):
+                throttle.acquire()
+                message = EmailMessage(
+                    subject=f"Circular: {distribution.subject}",
+                    body=EMAIL_BODY,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    bcc=[d.recipient for d in batch],
+                    headers={'To': 'undisclosed-recipients:;'},
+                    connection=connection,
+                )
+                message.attach(circular.pdf_filename, attachment, 'application/pdf')
+                try:
+                    with span('smtp_send'):
+                        refused = _send_batch(connection, message)
+                except Exception as exc:
+                    error   = f"{type(exc).__name__}: {exc}"
+                    refused = {d.recipient: error for d in batch}
+                    # The connection may be unusable after an SMTP error; start a fresh one.
+                    connection.close()
+                    _open(connection)
+                _record(batch, refused)
+                Distribution.objects.filter(pk=distribution_id).update(updated_at=timezone.now())
+        finally:
+            connection.close()
+
+        _finish(distribution)
+    finally:
+        close_old_connections()
+
+
+def _open(connection):
+    # If the server can't be reached, each batch's send() retries the
+    # connection itself and records the error against its recipients.
+    try:
+        connection.open()
+    except Exception:
+        pass
+
+
+def _send_batch(connection, message):
+    """
+    Send ``message`` and return ``{recipient: error}`` for each recipient that
+    was not accepted.
+    """
+    smtp = getattr(connection, 'connection', None)
+    if not isinstance(smtp, smtplib.SMTP):
+        # Not an open SMTP connection: only whole-message success is known.
+        if message.send():
+            return {}
+        return dict.fromkeys(message.recipients(), 'Message was not accepted.')
+
+    # What Django's SMTP backend does in _send(), but keeping sendmail's refusals.
+    encoding   = message.encoding or settings.DEFAULT_CHARSET
+    addresses  = {sanitize_address(r, encoding): r for r in message.recipients()}
+    from_email = sanitize_address(message.from_email, encoding)
+    try:
+        refused = smtp.sendmail(
+            from_email, list(addresses), message.message().as_bytes(linesep='\r\n')
+        )
+    except smtplib.SMTPRecipientsRefused as exc:
+        refused = exc.recipients
+    return {
+        addresses.get(address, address): f"{code} {reply.decode(errors='replace')}"
+        for address, (code, reply) in refused.items()
+    }
+
+
+def _record(batch, refused):
+    sent = [d.pk for d in batch if d.recipient not in refused]
+    Delivery.objects.filter(pk__in=sent).update(
+        status=Delivery.SENT, error='', attempts=F('attempts') + 1, sent_at=timezone.now(),
+    )
+    for delivery in batch:
+        if delivery.recipient in refused:
+            Delivery.objects.filter(pk=delivery.pk).update(
+                status=Delivery.FAILED, error=refused[delivery.recipient],
+                attempts=F('attempts') + 1, sent_at=None,
+            )
+
+
+def _finish(distribution):
+    statuses = set(distribution.deliveries.values_list('status', flat=True))
+    if statuses == {Delivery.SENT}:
+        distribution.status = Distribution.SENT
+    elif Delivery.SENT in statuses:
+        distribution.status = Distribution.PARTIAL
+    else:
+        distribution.status = Distribution.FAILED
+    distribution.save(update_fields=['status', 'updated_at'])
+
+
+def progress(distribution):
+    counts = {Delivery.PENDING: 0, Delivery.SENT: 0, Delivery.FAILED: 0}
+    for status in distribution.deliveries.values_list('status', flat=True):
+        counts[status] += 1
+    return counts
@@ -0,0 +1,343 @@
+# generator/gateway.py
+"""
+The gateway every Gemini call goes through.
+
+* A token bucket (``CIRCULAR_LLM_RATE`` calls/second, bursts of
+  ``CIRCULAR_LLM_BURST``) keeps us within quota. A call that can't get a
+  token within ``CIRCULAR_LLM_MAX_WAIT`` seconds is refused.
+* Concurrent calls for the same prompt (after ``llm_cache.normalize_prompt``)
+  are coalesced: one goes upstream and the others share its answer.
+* Timeouts, quota (429) and 5xx errors are retried up to
+  ``CIRCULAR_LLM_RETRIES`` times with full-jitter exponential backoff. Each
+  attempt is limited to ``CIRCULAR_LLM_TIMEOUT`` seconds.
+* After ``CIRCULAR_LLM_BREAKER_THRESHOLD`` consecutive failures the circuit
+  opens and calls are refused outright. After ``CIRCULAR_LLM_BREAKER_RESET``
+  seconds a single probe call is let through to test the upstream.
+
+A refused or exhausted call raises ``Unavailable``. So does any other
+upstream error, such as a 400/403 or a safety-blocked response whose
+``.text`` raises ``ValueError``. Those are not retried and don't count
+against the breaker, because the upstream did answer. The pipeline then
+falls back to ``pipeline.template_text``, so users get a plain circular
+instead of a 500. ``Unavailable`` is raised inside the cache's generate callback, so a
+fallback is never cached.
+
+The upstream is any object with ``generate(prompt, timeout)``,
+``agenerate(prompt, timeout)`` and ``stream(prompt, timeout)``, which is
+generator/llm.py in production. Tests can build a ``Gateway`` around a fake.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from generator          import llm, llm_cache
+from generator.throttle import TokenBucket
+
+# HTTP statuses worth retrying; google.api_core errors carry theirs in ``code``.
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class Unavailable(Exception):
+    """Gemini can't be used right now; callers should fall back."""
+
+
+def is_retryable(exc):
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    return getattr(exc, 'code', None) in RETRYABLE_CODES
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 1. Circuit breaker
+# ─────────────────────────────────────────────────────────────────────────────
+class CircuitBreaker:
+    CLOSED    = 'closed'
+    OPEN      = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold, reset_after, clock=time.monotonic):
+        self.threshold   = max(threshold, 1)
+        self.reset_after = reset_after
+        self.clock       = clock
+        self._failures   = 0
+        self._opened_at  = None
+        self._probing    = False
+        self._lock       = threading.Lock()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if self.clock() - self._opened_at >= self.reset_after:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def allow(self):
+        """Whether a call may go upstream. Half-open lets one probe through at a time."""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures  = 0
+            self._opened_at = None
+            self._probing   = False
+
+    def release(self):
+        """End a call without a verdict on the upstream (e.g. it was cancelled)."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.threshold:
+                self._opened_at = self.clock()
+            self._probing = False
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 2. Single-flight coalescing
+# ─────────────────────────────────────────────────────────────────────────────
+class SingleFlight:
+    """
+    Run a call once for all concurrent callers with the same key. Both
+    methods return ``(result, shared)``; ``shared`` is true for callers that
+    waited on someone else's call.
+    """
+
+    def __init__(self):
+        self._calls  = {}     # key -> concurrent.futures.Future
+        self._acalls = {}     # key -> (event loop, asyncio.Future)
+        self._lock   = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def ado(self, key, afn):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry  = self._acalls.get(key)
+            leader = entry is None or entry[0] is not loop
+            if leader:
+                future = loop.create_future()
+                # Mark the outcome as retrieved even if nobody else is waiting.
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self._acalls[key] = (loop, future)
+            else:
+                future = entry[1]
+        if not leader:
+            return await asyncio.shield(future), True
+
+        try:
+            result = await afn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                if self._acalls.get(key, (None, None))[1] is future:
+                    del self._acalls[key]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 3. Gateway
+# ─────────────────────────────────────────────────────────────────────────────
+class Gateway:
+
+    def __init__(self, backend, model=llm.GEMINI_MODEL):
+        self.backend      = backend
+        self.model        = model
+        self.timeout      = getattr(settings, 'CIRCULAR_LLM_TIMEOUT', 60)
+        self.retries      = getattr(settings, 'CIRCULAR_LLM_RETRIES', 2)
+        self.backoff      = getattr(settings, 'CIRCULAR_LLM_BACKOFF', 0.5)
+        self.backoff_max  = getattr(settings, 'CIRCULAR_LLM_BACKOFF_MAX', 8.0)
+        self.max_wait     = getattr(settings, 'CIRCULAR_LLM_MAX_WAIT', 10.0)
+        self.bucket       = TokenBucket(
+            getattr(settings, 'CIRCULAR_LLM_RATE', 1.0),
+            capacity=getattr(settings, 'CIRCULAR_LLM_BURST', 5),
+        )
+        self.breaker      = CircuitBreaker(
+            getattr(settings, 'CIRCULAR_LLM_BREAKER_THRESHOLD', 5),
+            getattr(settings, 'CIRCULAR_LLM_BREAKER_RESET', 30.0),
+        )
+        self.flight       = SingleFlight()
+        self._stats       = dict.fromkeys(
+            ('calls', 'coalesced', 'retries', 'failures', 'rejected', 'rate_limited', 'short_circuited'), 0
+        )
+        self._stats_lock  = threading.Lock()
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            return {**self._stats, 'circuit': self.breaker.state}
+
+    def _key(self, prompt):
+        return llm_cache.cache_key(self.model, prompt)
+
+    def _delay(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+
+    def _refuse_if_open(self):
+        if self.breaker.state == CircuitBreaker.OPEN:
+            self._count('short_circuited')
+            raise Unavailable("Gemini circuit is open")
+
+    def _admit(self):
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            raise Unavailable("Gemini circuit is open")
+        self._count('calls')
+
+    def _failed(self, exc, attempt):
+        """Record a failed attempt; raise unless it should be retried."""
+        if not is_retryable(exc):
+            # The upstream answered; it's this request that was rejected.
+            self.breaker.record_success()
+            self._count('rejected')
+            raise Unavailable(f"Gemini rejected the request: {exc}") from exc
+        self.breaker.record_failure()
+        if attempt >= self.retries:
+            self._count('failures')
+            raise Unavailable(f"Gemini failed after {attempt + 1} attempt(s): {exc}") from exc
+        self._count('retries')
+
+    # --- 3.1 Blocking calls ---
+    def generate(self, prompt):
+        text, shared = self.flight.do(self._key(prompt), lambda: self._generate(prompt))
+        if shared:
+            self._count('coalesced')
+        return text
+
+    def _generate(self, prompt):
+        for attempt in range(self.retries + 1):
+            self._refuse_if_open()
+            if not self.bucket.acquire(timeout=self.max_wait):
+                self._count('rate_limited')
+                raise Unavailable("Gemini rate limit: no capacity")
+            self._admit()
+            try:
+                text = self.backend.generate(prompt, timeout=self.timeout)
+            except Exception as exc:
+                self._failed(exc, attempt)
+                time.sleep(self._delay(attempt))
+            else:
+                self.breaker.record_success()
+                return text
+
+    def stream(self, prompt):
+        """
+        Yield chunks from the upstream stream. There are no retries (chunks may
+        already have been shown), and ``Unavailable`` is only raised before the
+        first chunk.
+        """
+        self._refuse_if_open()
+        if not self.bucket.acquire(timeout=self.max_wait):
+            self._count('rate_limited')
+            raise Unavailable("Gemini rate limit: no capacity")
+        self._admit()
+
+        started = False
+        try:
+            for chunk in self.backend.stream(prompt, timeout=self.timeout):
+                started = True
+                yield chunk
+        except Exception as exc:
+            if not is_retryable(exc):
+                self.breaker.record_success()
+                self._count('rejected')
+                if started:
+                    raise
+                raise Unavailable(f"Gemini rejected the request: {exc}") from exc
+            self.breaker.record_failure()
+            self._count('failures')
+            if started:
+                raise
+            raise Unavailable(f"Gemini stream failed: {exc}") from exc
+        except GeneratorExit:
+            # The reader went away; that says nothing about the upstream.
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+
+    # --- 3.2 Async calls ---
+    async def agenerate(self, prompt):
+        text, shared = await self.flight.ado(self._key(prompt), lambda: self._agenerate(prompt))
+        if shared:
+            self._count('coalesced')
+        return text
+
+    async def _agenerate(self, prompt):
+        for attempt in range(self.retries + 1):
+            self._refuse_if_open()
+            if not await self.bucket.aacquire(timeout=self.max_wait):
+                self._count('rate_limited')
+                raise Unavailable("Gemini rate limit: no capacity")
+            self._admit()
+            try:
+                text = await asyncio.wait_for(
+                    self.backend.agenerate(prompt, timeout=self.timeout), self.timeout
+                )
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as exc:
+                self._failed(exc, attempt)
+                await asyncio.sleep(self._delay(attempt))
+            else:
+                self.breaker.record_success()
+                return text
+
+
+_gateway      = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = Gateway(llm)
+        return _gateway
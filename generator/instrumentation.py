@@ -0,0 +1,166 @@
+# generator/instrumentation.py
+"""
+Lightweight per-stage latency instrumentation.
+
+Wrap a stage in ``with span('llm'):`` and its duration is
+
+* added to the current request's ``Server-Timing`` header (see
+  ``ServerTimingMiddleware``), and
+* recorded in a per-process histogram exported in Prometheus text format
+  by the ``/metrics`` view.
+
+Spans recorded outside a request (background jobs, email sending) only
+feed the histograms.
+"""
+
+import contextvars
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime   import datetime
+from pathlib    import Path
+
+from django.conf import settings
+
+# Histogram bucket upper bounds, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_request_spans = contextvars.ContextVar('request_spans', default=None)
+
+
+class Histogram:
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)     # last slot is +Inf
+        self.sum    = 0.0
+        self.count  = 0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        self.counts[i] += 1
+        self.sum       += seconds
+        self.count     += 1
+
+
+_histograms      = {}
+_histograms_lock = threading.Lock()
+
+
+def observe(name, seconds):
+    with _histograms_lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+@contextmanager
+def span(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 1. Per-request collection
+# ─────────────────────────────────────────────────────────────────────────────
+def start_request():
+    """Begin collecting spans for the current request; returns a token for ``end_request``."""
+    return _request_spans.set([])
+
+
+def end_request(token):
+    spans = _request_spans.get() or []
+    _request_spans.reset(token)
+    return spans
+
+
+def server_timing(spans, total=None):
+    # Repeated stages (e.g. several SMTP batches) are summed into one entry.
+    totals = {}
+    for name, seconds in spans:
+        totals[name] = totals.get(name, 0.0) + seconds
+    if total is not None:
+        totals['total'] = total
+    return ', '.join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 2. Prometheus text exposition
+# ─────────────────────────────────────────────────────────────────────────────
+def render_metrics(counters=None, gauges=None):
+    """
+    Render the stage histograms, plus any ``{metric_name: value}`` counters
+    and gauges, in the Prometheus text format.
+    """
+    lines = [
+        "# HELP circular_stage_duration_seconds Time spent in each circular pipeline stage.",
+        "# TYPE circular_stage_duration_seconds histogram",
+    ]
+    with _histograms_lock:
+        snapshot = {
+            name: (list(h.counts), h.sum, h.count) for name, h in sorted(_histograms.items())
+        }
+    for name, (counts, total, count) in snapshot.items():
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, counts):
+            cumulative += bucket_count
+            lines.append(f'circular_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'circular_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+        lines.append(f'circular_stage_duration_seconds_sum{{stage="{name}"}} {total}')
+        lines.append(f'circular_stage_duration_seconds_count{{stage="{name}"}} {count}')
+
+    for metric, value in (counters or {}).items():
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    for metric, value in (gauges or {}).items():
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 3. Sampling profiler for slow requests
+# ─────────────────────────────────────────────────────────────────────────────
+def start_profile():
+    """
+    Return an enabled ``cProfile.Profile`` for a sampled fraction
+    (``CIRCULAR_PROFILE_SAMPLE_RATE``) of requests, else ``None``.
+    """
+    rate = getattr(settings, 'CIRCULAR_PROFILE_SAMPLE_RATE', 0.0)
+    if not rate or random.random() >= rate:
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another profiler is already active on this thread.
+        return None
+    return profile
+
+
+def finish_profile(profile, request, seconds):
+    """Stop ``profile`` and keep its stats if the request took longer than ``CIRCULAR_PROFILE_SLOW_MS``."""
+    profile.disable()
+    if seconds * 1000 < getattr(settings, 'CIRCULAR_PROFILE_SLOW_MS', 2000):
+        return None
+    profile_dir = Path(getattr(settings, 'CIRCULAR_PROFILE_DIR', settings.BASE_DIR / 'profiles'))
+    os.makedirs(profile_dir, exist_ok=True)
+    slug = re.sub(r'[^\w]+', '_', request.path_info).strip('_') or 'root'
+    path = profile_dir / f"{datetime.now():%Y%m%d-%H%M%S}-{slug}-{seconds * 1000:.0f}ms.prof"
+    profile.dump_stats(path)
+    return path
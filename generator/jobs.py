@@ -0,0 +1,132 @@
+# generator/jobs.py
+"""
+Background circular generation.
+
+Jobs are rows in the ``CircularJob`` table (our SQLite database is the
+queue, so no broker is needed) and are executed by a per-process pool of
+``CIRCULAR_JOB_WORKERS`` threads. A worker claims a job with a conditional
+UPDATE, so two processes picking up the same backlog never both run a job.
+
+While a process runs jobs, a heartbeat thread refreshes their ``updated_at``
+every ``CIRCULAR_JOB_HEARTBEAT`` seconds. On the same beat it queues again,
+and runs, any job still marked running whose claim is more than
+``CIRCULAR_JOB_STALE_AFTER`` seconds old, since its process has died.
+Execution is therefore at-least-once: a process that is alive but can't
+refresh its claims for that long (e.g. the database stays locked) may see
+its job run a second time elsewhere. A second run reuses the circular the
+first one stored, if any, instead of generating it again.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime           import timedelta
+
+from django.conf  import settings
+from django.db    import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+
+from generator        import pipeline
+from generator.models import Circular, CircularJob
+
+_executor      = None
+_executor_lock = threading.Lock()
+_running       = set()      # ids of the jobs this process is running
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CIRCULAR_JOB_WORKERS', 4),
+                thread_name_prefix='circular-job',
+            )
+            # Pick up anything left queued, or stuck running, by a previous process.
+            requeue_stale()
+            _submit_queued(_executor)
+            threading.Thread(target=_heartbeat, name='circular-job-heartbeat', daemon=True).start()
+    return _executor
+
+
+def _submit_queued(executor):
+    for job_id in CircularJob.objects.filter(status=CircularJob.QUEUED).values_list('pk', flat=True):
+        executor.submit(run_job, job_id)
+
+
+def requeue_stale():
+    """Queue again the jobs whose worker died mid-run; returns how many."""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'CIRCULAR_JOB_STALE_AFTER', 600))
+    return CircularJob.objects.filter(status=CircularJob.RUNNING, updated_at__lt=cutoff).update(
+        status=CircularJob.QUEUED, updated_at=timezone.now()
+    )
+
+
+def beat():
+    """
+    Refresh the claims of this process's running jobs, then re-queue and run
+    stale jobs and email distributions (see generator/distribution.py).
+    """
+    from generator import distribution      # it imports this module
+
+    if _running:
+        CircularJob.objects.filter(pk__in=list(_running), status=CircularJob.RUNNING).update(
+            updated_at=timezone.now()
+        )
+    if requeue_stale():
+        _submit_queued(get_executor())
+    distribution.requeue_stale()
+
+
+def _heartbeat():
+    while True:
+        try:
+            beat()
+        except DatabaseError:
+            pass        # e.g. the database is locked; the next beat retries
+        finally:
+            close_old_connections()
+        time.sleep(getattr(settings, 'CIRCULAR_JOB_HEARTBEAT', 30))
+
+
+def submit(inputs, base_url, use_cache=True):
+    """Queue a circular for generation and return its job."""
+    executor = get_executor()
+    job = CircularJob.objects.create(
+        id=uuid.uuid4().hex[:8].upper(),
+        inputs=inputs,
+        base_url=base_url,
+        use_cache=use_cache,
+    )
+    transaction.on_commit(lambda: executor.submit(run_job, job.pk))
+    return job
+
+
+def run_job(job_id):
+    try:
+        claimed = CircularJob.objects.filter(pk=job_id, status=CircularJob.QUEUED).update(
+            status=CircularJob.RUNNING, updated_at=timezone.now()
+        )
+        if not claimed:
+            return
+
+        _running.add(job_id)
+        job = CircularJob.objects.get(pk=job_id)
+        try:
+            # A re-queued job may have stored its circular before its worker died.
+            record  = Circular.objects.filter(pk=job.pk).first()
+            context = (
+                pipeline.circular_context(record) if record is not None
+                else pipeline.run(job.inputs, job.pk, use_cache=job.use_cache)
+            )
+        except Exception as exc:
+            job.status = CircularJob.FAILED
+            job.error  = f"{type(exc).__name__}: {exc}"
+        else:
+            job.status = CircularJob.DONE
+            job.result = context
+        job.save(update_fields=['status', 'result', 'error', 'updated_at'])
+    finally:
+        _running.discard(job_id)
+        close_old_connections()
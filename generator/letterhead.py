@@ -0,0 +1,124 @@
+# generator/letterhead.py
+"""
+Cached letterhead fragments for the result page and the PDF.
+
+Everything on a circular except its body and a few fields is the same for
+a department: the seal, logos and institute lines with the department
+name, the signature block, and the stylesheet. ``result.html`` pulls these
+in with ``{% letterhead 'header' %}`` (see generator/templatetags/). Each
+fragment is rendered once per combination of the values it uses, e.g.
+``dept_full`` for the header or the HOD's name and signature for the
+signatures, and then served from memory.
+
+Because the key is made of those values (which ``pipeline.build_context``
+takes from ``DEPT_FULL_BY_CODE``, ``HOD_BY_DEPT`` and ``HOD_SIG_URLS``), a
+changed mapping simply renders a new fragment. The whole cache is dropped
+when ``fingerprint()`` changes, i.e. when a fragment template or a bundled
+logo or signature file is edited on disk; that is checked at most every
+``CIRCULAR_LETTERHEAD_CHECK_INTERVAL`` seconds. Django's cached template
+loader would keep serving the old templates, so its cache is reset too.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+from django.conf            import settings
+from django.template        import engines
+from django.template.loader import get_template
+
+from generator import assets
+
+# name -> (template, context fields the fragment depends on)
+FRAGMENTS = {
+    'styles':     ('generator/circular.css',                  ()),
+    'header':     ('generator/letterhead/header.html',        ('dept_full',)),
+    'signatures': ('generator/letterhead/signatures.html',    ('department', 'hod_name', 'hod_signature_url')),
+}
+
+# Departments are free text in batch specs, so bound the number of entries.
+MAX_FRAGMENTS = 256
+
+_fragments   = {}      # (name, *values) -> rendered SafeString
+_fingerprint = None
+_checked_at  = None
+_digests     = {}      # (path, mtime_ns, size) -> sha256 of the file, so unchanged files aren't re-read
+_lock        = threading.Lock()
+
+
+def _source_files():
+    """``(name, path)`` of every file the fragments and the PDFs' images come from."""
+    for template_name, _ in FRAGMENTS.values():
+        yield template_name, get_template(template_name).origin.name
+    for path in assets.bundled_assets():
+        yield path.relative_to(assets.ASSET_DIR).as_posix(), path
+
+
+def _file_digest(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key    = (str(path), stat.st_mtime_ns, stat.st_size)
+    digest = _digests.get(key)
+    if digest is None:
+        with open(path, 'rb') as f:
+            digest = _digests[key] = hashlib.sha256(f.read()).hexdigest()
+    return digest
+
+
+def _compute_fingerprint():
+    # By content, not mtime: the PDF cache key includes this value, so it
+    # must agree across processes, hosts and fresh checkouts.
+    lines = [f"{name}:{_file_digest(path)}" for name, path in _source_files()]
+    return hashlib.sha256('\n'.join(lines).encode('utf-8')).hexdigest()
+
+
+def _reset_template_loaders():
+    for engine in engines.all():
+        for loader in getattr(getattr(engine, 'engine', None), 'template_loaders', ()):
+            loader.reset()
+
+
+def fingerprint():
+    """
+    A digest of the fragment templates and bundled assets that changes when
+    any of them does. It is also part of the PDF cache key
+    (``pipeline.context_hash``).
+    Re-checked at most every ``CIRCULAR_LETTERHEAD_CHECK_INTERVAL`` seconds;
+    ``0`` checks on every call.
+    """
+    global _fingerprint, _checked_at
+    interval = getattr(settings, 'CIRCULAR_LETTERHEAD_CHECK_INTERVAL', 2.0)
+    now      = time.monotonic()
+    if _checked_at is not None and now - _checked_at < interval:
+        return _fingerprint
+
+    current = _compute_fingerprint()
+    with _lock:
+        if current != _fingerprint:
+            if _fingerprint is not None:
+                _reset_template_loaders()
+            _fragments.clear()
+            _fingerprint = current
+        _checked_at = now
+    return current
+
+
+def fragment(name, context):
+    """The rendered fragment ``name`` for the values it uses from ``context``."""
+    template_name, fields = FRAGMENTS[name]
+    values = {field: context.get(field, '') for field in fields}
+    key    = (name, *values.values())
+
+    fingerprint()
+    html = _fragments.get(key)
+    if html is None:
+        html = get_template(template_name).render(values)
+        with _lock:
+            if len(_fragments) >= MAX_FRAGMENTS:
+                _fragments.clear()
+            _fragments[key] = html
+    return html
+
@@ -0,0 +1,98 @@
+# generator/llm.py
+"""
+The process-wide Gemini client.
+
+``google.generativeai`` pulls in gRPC and protobuf, which costs about a
+second and tens of megabytes per process. It is imported on first use, so
+management commands, migrations and workers that never call Gemini don't
+pay for it. The ``GenerativeModel`` is built once per process and shared by
+every request and job thread; call ``warm_up()`` to do all of this ahead of
+the first request (see circulargen/wsgi.py).
+
+These are the raw calls; the rest of the app goes through the rate limits,
+retries and circuit breaker in generator/gateway.py.
+
+Async views await ``agenerate()``. The SDK's async client holds a grpc.aio
+channel bound to the event loop it was first used on, so it is only used
+under ASGI (circulargen/asgi.py sets ``native_async``), on the server's one
+long-lived loop. Anywhere else, e.g. the per-request loop Django runs an
+async view on under WSGI, ``agenerate`` runs the blocking call on a thread.
+"""
+
+import asyncio
+import os
+import threading
+
+from django.conf import settings
+
+GEMINI_MODEL = 'gemini-1.5-pro-latest'
+DEMO_API_KEY = 'DEMO-API-KEY'
+
+api_key = getattr(settings, 'GOOGLE_API_KEY', os.environ.get("GOOGLE_API_KEY"))
+
+native_async = False    # True under ASGI; see circulargen/asgi.py
+
+_model       = None
+_model_lock  = threading.Lock()
+_async_loop  = None     # the event loop that owns the SDK's async client
+
+
+def is_demo():
+    return api_key == DEMO_API_KEY
+
+
+def get_model():
+    """Return the shared ``GenerativeModel``, importing and configuring the SDK on first call."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                import google.generativeai as genai
+                if api_key:
+                    genai.configure(api_key=api_key)
+                _model = genai.GenerativeModel(GEMINI_MODEL)
+    return _model
+
+
+def _request_options(timeout):
+    return {'timeout': timeout} if timeout else None
+
+
+def generate(prompt, timeout=None):
+    return get_model().generate_content(prompt, request_options=_request_options(timeout)).text
+
+
+def stream(prompt, timeout=None):
+    response = get_model().generate_content(
+        prompt, stream=True, request_options=_request_options(timeout)
+    )
+    for chunk in response:
+        yield chunk.text
+
+
+def _owns_async_client():
+    """True if the running event loop may use the SDK's async client."""
+    global _async_loop
+    loop = asyncio.get_running_loop()
+    if native_async and _async_loop is None:
+        with _model_lock:
+            if _async_loop is None:
+                _async_loop = loop
+    return loop is _async_loop
+
+
+async def agenerate(prompt, timeout=None):
+    if not _owns_async_client():
+        return await asyncio.to_thread(generate, prompt, timeout)
+    if _model is None:
+        # The first SDK import takes about a second; keep it off the event loop.
+        await asyncio.to_thread(get_model)
+    response = await get_model().generate_content_async(
+        prompt, request_options=_request_options(timeout)
+    )
+    return response.text
+
+
+def warm_up():
+    if not is_demo():
+        get_model()
@@ -0,0 +1,185 @@
+# generator/llm_cache.py
+"""
+Content-addressed cache for Gemini responses.
+
+Entries are keyed on ``sha256(model, normalized prompt)``. Lookups go to a
+size- and TTL-bounded in-memory LRU first and then to the ``LLMResponse``
+table, so regenerating the same circular after a layout tweak does not cost
+another round-trip. The raw response text is cached; callers apply their
+usual post-processing on top.
+"""
+
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime    import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf  import settings
+from django.utils import timezone
+
+from generator.models import LLMResponse
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace differences that don't change what the model is asked."""
+    prompt = unicodedata.normalize('NFC', prompt)
+    lines  = [re.sub(r'[ \t]+', ' ', line).strip() for line in prompt.splitlines()]
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+
+def cache_key(model, prompt):
+    payload = f"{model}\0{normalize_prompt(prompt)}".encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 1. In-memory LRU with TTL
+# ─────────────────────────────────────────────────────────────────────────────
+class MemoryLRU:
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl         = ttl
+        self._items      = OrderedDict()    # key -> (expires_at, text)
+        self._lock       = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def put(self, key, text, ttl=None):
+        with self._lock:
+            self._items[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), text)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+CACHE_TTL = getattr(settings, 'CIRCULAR_LLM_CACHE_TTL', 7 * 24 * 3600)
+
+memory = MemoryLRU(getattr(settings, 'CIRCULAR_LLM_CACHE_SIZE', 256), CACHE_TTL)
+
+_stats      = {'hits': 0, 'memory_hits': 0, 'store_hits': 0, 'misses': 0, 'bypassed': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(*names):
+    with _stats_lock:
+        for name in names:
+            _stats[name] += 1
+
+
+def stats():
+    with _stats_lock:
+        return {**_stats, 'memory_entries': len(memory)}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 2. Lookup, store, invalidation
+# ─────────────────────────────────────────────────────────────────────────────
+def get(model, prompt):
+    key  = cache_key(model, prompt)
+    text = memory.get(key)
+    if text is not None:
+        _count('hits', 'memory_hits')
+        return text
+
+    cutoff = timezone.now() - timedelta(seconds=CACHE_TTL)
+    entry  = LLMResponse.objects.filter(key=key, created_at__gte=cutoff).first()
+    if entry is None:
+        _count('misses')
+        return None
+
+    # Only keep it in memory for what is left of its lifetime.
+    remaining = CACHE_TTL - (timezone.now() - entry.created_at).total_seconds()
+    memory.put(key, entry.text, ttl=remaining)
+    _count('hits', 'store_hits')
+    return entry.text
+
+
+def put(model, prompt, text):
+    key = cache_key(model, prompt)
+    memory.put(key, text)
+    LLMResponse.objects.update_or_create(
+        key=key,
+        defaults={'model': model, 'text': text, 'created_at': timezone.now()},
+    )
+
+
+def invalidate(model, prompt):
+    key = cache_key(model, prompt)
+    memory.pop(key)
+    LLMResponse.objects.filter(key=key).delete()
+
+
+def clear():
+    memory.clear()
+    return LLMResponse.objects.all().delete()[0]
+
+
+def purge_expired():
+    cutoff = timezone.now() - timedelta(seconds=CACHE_TTL)
+    return LLMResponse.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+def enabled():
+    return getattr(settings, 'CIRCULAR_LLM_CACHE_ENABLED', True)
+
+
+def get_or_generate(model, prompt, generate, bypass=False):
+    """
+    Return the cached response text for ``prompt`` or call ``generate()``.
+
+    With ``bypass=True`` the cache is not read, but the fresh response still
+    replaces whatever was stored, so the next regular request sees it.
+    """
+    if not enabled():
+        return generate()
+    if bypass:
+        _count('bypassed')
+    else:
+        text = get(model, prompt)
+        if text is not None:
+            return text
+
+    text = generate()
+    put(model, prompt, text)
+    return text
+
+
+async def aget_or_generate(model, prompt, agenerate, bypass=False):
+    """``get_or_generate`` for async callers; ``agenerate`` is a coroutine function."""
+    if not enabled():
+        return await agenerate()
+    if bypass:
+        _count('bypassed')
+    else:
+        text = await sync_to_async(get)(model, prompt)
+        if text is not None:
+            return text
+
+    text = await agenerate()
+    await sync_to_async(put)(model, prompt, text)
+    return text
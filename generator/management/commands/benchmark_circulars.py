@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from generator import benchmark
+
+
+class Command(BaseCommand):
+    help = "Benchmark circular generation, PDF rendering and email delivery offline (see generator/benchmark.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*',
+                            help=f"Scenarios to run (default: all of {', '.join(benchmark.SCENARIOS)}).")
+        parser.add_argument('-n', '--requests', type=int, default=20, help="Iterations per scenario.")
+        parser.add_argument('-c', '--concurrency', type=int, default=4, help="Concurrent clients.")
+        parser.add_argument('--llm-latency', type=float, default=0.0, help="Simulated Gemini latency in seconds.")
+        parser.add_argument('--batch-size', type=int, default=6, help="Specs per batch upload.")
+        parser.add_argument('--recipients', type=int, default=500, help="Recipients per email distribution.")
+        parser.add_argument('--email-rate', type=float, help="Messages per second (default: CIRCULAR_EMAIL_RATE).")
+        parser.add_argument('--compare-assets', action='store_true',
+                            help="Also report PDF size and render time with CIRCULAR_ASSET_OPTIMIZE off and on.")
+        parser.add_argument('-o', '--output', help="Write the JSON report here instead of stdout.")
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(benchmark.SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+        report = benchmark.run(
+            scenarios=options['scenarios'] or benchmark.SCENARIOS,
+            requests=options['requests'],
+            concurrency=options['concurrency'],
+            llm_latency=options['llm_latency'],
+            batch_size=options['batch_size'],
+            recipients=options['recipients'],
+            email_rate=options['email_rate'],
+            compare_assets=options['compare_assets'],
+        )
+
+        for name, result in report['scenarios'].items():
+            latency = result['latency_ms'] or {}
+            self.stderr.write(
+                f"{name:<11} p50 {latency.get('p50', '-'):>9} ms  p95 {latency.get('p95', '-'):>9} ms  "
+                f"p99 {latency.get('p99', '-'):>9} ms  {result['throughput_rps']:>7} req/s  "
+                f"errors {result['errors']}/{result['requests']}"
+            )
+
+        assets = report.get('asset_optimization')
+        if assets:
+            for label in ('before', 'after'):
+                self.stderr.write(
+                    f"assets {label:<6} {assets[label]['pdf_bytes']:>9} bytes  "
+                    f"p50 {assets[label]['render_ms']['p50']:>9} ms"
+                )
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,45 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from generator import batch
+
+
+class Command(BaseCommand):
+    help = "Generate one circular per spec in a CSV/JSON file and write them to a ZIP."
+
+    def add_arguments(self, parser):
+        parser.add_argument('specs', help="CSV or JSON file with one circular per row/object.")
+        parser.add_argument('-o', '--output', default='circulars.zip', help="ZIP file to write ('-' for stdout).")
+        parser.add_argument('--regenerate', action='store_true', help="Don't reuse cached Gemini responses.")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['specs'], 'rb') as f:
+                specs = batch.parse_specs(f.read(), options['specs'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Could not read {options['specs']}: {exc}")
+
+        failed  = []
+        results = batch.run_batch(specs, use_cache=not options['regenerate'])
+
+        def report(results):
+            for entry, pdf_bytes in results:
+                if entry['status'] != 'ok':
+                    failed.append(entry)
+                self.stderr.write(f"[{entry['index']:>3}] {entry['status']:<6} {entry['department']:<5} "
+                                  f"{entry['subject']} {entry.get('error', '')}")
+                yield entry, pdf_bytes
+
+        out = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for chunk in batch.stream_zip(report(results)):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+
+        self.stderr.write(f"{len(specs) - len(failed)}/{len(specs)} circulars generated.")
+        if failed:
+            self.stderr.write(json.dumps(failed, indent=2))
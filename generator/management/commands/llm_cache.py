@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from generator        import llm_cache
+from generator.models import LLMResponse
+
+
+class Command(BaseCommand):
+    help = "Inspect or invalidate the cached Gemini responses."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help="Delete every cached response.")
+        parser.add_argument('--purge-expired', action='store_true', help="Delete responses older than the TTL.")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write(f"Deleted {llm_cache.clear()} cached responses.")
+        elif options['purge_expired']:
+            self.stdout.write(f"Deleted {llm_cache.purge_expired()} expired responses.")
+        else:
+            self.stdout.write(f"{LLMResponse.objects.count()} cached responses "
+                              f"(TTL {llm_cache.CACHE_TTL}s).")
@@ -0,0 +1,106 @@
+import io
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test                 import override_settings
+
+from generator import assets, pdf_engine, pipeline
+
+SAMPLE_INPUTS = {
+    'subject':         'Internal Assessment Schedule',
+    'date':            '01-08-2025',
+    'audience':        'All 3rd semester students',
+    'urgency':         'High',
+    'agenda':          'Second internal assessment',
+    'additional_info': 'Students must carry their ID cards.',
+    'venue':           'Main Block, Room 204',
+    'event_datetime':  '12-08-2025, 10:00 AM',
+    'department':      'CSE',
+    'recipient_email': '',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the print-optimized variants of the bundled letterhead images and report "
+        "their sizes; with --pdf, also compare PDF size and render time before and after."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pdf', action='store_true', help="Also render a sample circular both ways.")
+        parser.add_argument('--runs', type=int, default=5, help="Renders per configuration (default: 5).")
+        parser.add_argument('--json', dest='json_path', help="Also write the report as JSON to this file.")
+
+    def handle(self, *args, **options):
+        report = {'assets': self.asset_report()}
+        if options['pdf']:
+            report['pdf'] = self.pdf_report(max(options['runs'], 1))
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+    def asset_report(self):
+        from PIL import Image
+
+        rows = []
+        self.stdout.write(f"{'asset':<28} {'original':>12} {'optimized':>12} {'saved':>6}  pixels")
+        for path in assets.bundled_assets():
+            if path.suffix.lower() not in assets.OPTIMIZABLE_SUFFIXES:
+                continue
+            data, _ = assets.optimized_asset(path)
+            with Image.open(path) as original:
+                before_px = original.size
+            with Image.open(io.BytesIO(data)) as variant:
+                after_px = variant.size
+            row = {
+                'asset':     f"{path.parent.name}/{path.name}",
+                'original':  path.stat().st_size,
+                'optimized': len(data),
+                'pixels':    [list(before_px), list(after_px)],
+            }
+            rows.append(row)
+            self.stdout.write(
+                f"{row['asset']:<28} {row['original']:>12,} {row['optimized']:>12,} "
+                f"{1 - row['optimized'] / row['original']:>6.0%}  "
+                f"{before_px[0]}x{before_px[1]} -> {after_px[0]}x{after_px[1]}"
+            )
+        return rows
+
+    def pdf_report(self, runs):
+        context = pipeline.build_context(
+            SAMPLE_INPUTS, pipeline.template_text(SAMPLE_INPUTS), 'SAMPLE01'
+        )
+        configurations = {
+            'before': {'CIRCULAR_ASSET_OPTIMIZE': False, 'CIRCULAR_PDF_QUALITY': 'default'},
+            'after':  {},       # the configured asset and quality settings
+        }
+        results = {}
+        for name, overrides in configurations.items():
+            with override_settings(**overrides):
+                quality = pdf_engine.write_options()
+                timings = []
+                for _ in range(runs):
+                    # Start cold each time so image decoding is part of the measurement.
+                    assets.asset_cache.clear()
+                    pdf_engine._image_cache.clear()
+                    started   = time.perf_counter()
+                    pdf_bytes = pdf_engine._render(context, None)
+                    timings.append((time.perf_counter() - started) * 1000)
+            results[name] = {
+                'quality':   quality,
+                'pdf_bytes': len(pdf_bytes),
+                'render_ms': round(statistics.median(timings), 1),
+            }
+
+        before, after = results['before'], results['after']
+        self.stdout.write("")
+        self.stdout.write(f"{'':<8} {'PDF bytes':>12} {'render ms (median)':>20}")
+        for name, result in results.items():
+            self.stdout.write(f"{name:<8} {result['pdf_bytes']:>12,} {result['render_ms']:>20}")
+        self.stdout.write(
+            f"PDF size {1 - after['pdf_bytes'] / before['pdf_bytes']:.0%} smaller, "
+            f"render time {1 - after['render_ms'] / before['render_ms']:.0%} lower."
+        )
+        return results
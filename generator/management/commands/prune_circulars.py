@@ -0,0 +1,43 @@
+import time
+from datetime import timedelta
+
+from django.conf                 import settings
+from django.core.management.base import BaseCommand
+from django.utils                import timezone
+
+from generator        import storage
+from generator.models import Circular
+
+
+class Command(BaseCommand):
+    help = "Delete circulars past the retention period and PDFs no circular refers to."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'CIRCULAR_RETENTION_DAYS', 365),
+                            help="Keep circulars created within this many days.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be deleted.")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        cutoff  = timezone.now() - timedelta(days=options['days'])
+
+        expired = Circular.objects.filter(created_at__lt=cutoff)
+        count   = expired.count()
+        if not dry_run:
+            expired.delete()
+
+        referenced = set(Circular.objects.values_list('content_hash', flat=True))
+        removed    = storage.sweep(referenced, dry_run=dry_run)
+
+        # PDFs written by older versions as generated_pdfs/circular_<subject>.pdf
+        legacy = [
+            path for path in storage.pdf_root().glob('circular_*.pdf')
+            if path.stat().st_mtime < time.time() - options['days'] * 86400
+        ]
+        if not dry_run:
+            for path in legacy:
+                path.unlink(missing_ok=True)
+
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(f"{verb} {count} circulars, {len(removed)} stored PDFs "
+                          f"and {len(legacy)} legacy PDF files.")
@@ -1,16 +1,91 @@
 # generator/middleware.py
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.shortcuts import redirect
 from django.urls import reverse
 
+from generator import instrumentation
+
 class LoginRequiredMiddleware:
+    sync_capable  = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
         self.login_url = reverse('admin:login')
+        self.metrics_url = reverse('metrics')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _exempt(self, path):
+        return (
+            path.startswith(self.login_url) or path.startswith('/admin/')
+            or path.startswith('/static/') or path == self.metrics_url
+        )
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         path = request.path_info
-        if path.startswith(self.login_url) or path.startswith('/admin/') or path.startswith('/static/'):
+        if self._exempt(path):
             return self.get_response(request)
         if not request.user.is_authenticated:
             return redirect(f"{self.login_url}?next={path}")
         return self.get_response(request)
+
+    async def __acall__(self, request):
+        path = request.path_info
+        if self._exempt(path):
+            return await self.get_response(request)
+        # request.user would hit the session and user tables synchronously.
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect(f"{self.login_url}?next={path}")
+        return await self.get_response(request)
+
+
+class ServerTimingMiddleware:
+    """
+    Report the request's instrumentation spans in a ``Server-Timing`` header
+    and, when sampled, profile it (see ``instrumentation.start_profile``).
+    Requests served asynchronously are not profiled: cProfile follows a
+    thread, and on the event loop that thread serves every request at once.
+    """
+    sync_capable  = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token   = instrumentation.start_request()
+        profile = instrumentation.start_profile()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            spans   = instrumentation.end_request(token)
+            if profile is not None:
+                instrumentation.finish_profile(profile, request, elapsed)
+        return self._finish(response, spans, elapsed)
+
+    async def __acall__(self, request):
+        token   = instrumentation.start_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            spans   = instrumentation.end_request(token)
+        return self._finish(response, spans, elapsed)
+
+    def _finish(self, response, spans, elapsed):
+        instrumentation.observe('request', elapsed)
+        response['Server-Timing'] = instrumentation.server_timing(spans, total=elapsed)
+        return response
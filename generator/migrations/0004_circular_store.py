@@ -0,0 +1,42 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0003_email_distribution'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Circular',
+            fields=[
+                ('circular_id', models.CharField(max_length=8, primary_key=True, serialize=False)),
+                ('subject', models.CharField(max_length=255)),
+                ('department', models.CharField(blank=True, max_length=10)),
+                ('inputs', models.JSONField()),
+                ('text', models.TextField()),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('pdf_size', models.PositiveIntegerField(default=0)),
+                ('llm_ms', models.FloatField(blank=True, null=True)),
+                ('render_ms', models.FloatField(blank=True, null=True)),
+                ('persist_ms', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.RemoveField(
+            model_name='distribution',
+            name='pdf_filename',
+        ),
+        migrations.AddField(
+            model_name='distribution',
+            name='circular',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='distributions', to='generator.circular'),
+        ),
+    ]
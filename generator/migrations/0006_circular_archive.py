@@ -0,0 +1,72 @@
+from django.db import migrations
+
+# Full-text index of the circular archive (see generator/archive.py).
+#
+# The FTS5 table shares its rowid with generator_circular and is kept current
+# by triggers, so every insert, edit and delete of a Circular is indexed in the
+# same transaction, whichever code path made it. Updates that only touch the
+# cached PDF columns don't fire the update trigger.
+
+INDEXED_VALUES = """
+    new.rowid,
+    new.circular_id,
+    new.subject,
+    new.department,
+    ifnull(json_extract(new.inputs, '$.audience'), ''),
+    ifnull(json_extract(new.inputs, '$.agenda'), ''),
+    ifnull(json_extract(new.inputs, '$.date'), '') || ' ' ||
+        ifnull(json_extract(new.inputs, '$.event_datetime'), '') || ' ' ||
+        ifnull(date(new.created_at), ''),
+    new.text
+"""
+
+INDEXED_COLUMNS = "rowid, circular_id, subject, department, audience, agenda, dates, text"
+
+FORWARD = [
+    """
+    CREATE VIRTUAL TABLE generator_circular_fts USING fts5(
+        circular_id UNINDEXED, subject, department, audience, agenda, dates, text,
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER generator_circular_fts_insert AFTER INSERT ON generator_circular BEGIN
+        INSERT INTO generator_circular_fts ({INDEXED_COLUMNS}) VALUES ({INDEXED_VALUES});
+    END
+    """,
+    f"""
+    CREATE TRIGGER generator_circular_fts_update
+    AFTER UPDATE OF subject, department, inputs, text ON generator_circular BEGIN
+        DELETE FROM generator_circular_fts WHERE rowid = old.rowid;
+        INSERT INTO generator_circular_fts ({INDEXED_COLUMNS}) VALUES ({INDEXED_VALUES});
+    END
+    """,
+    """
+    CREATE TRIGGER generator_circular_fts_delete AFTER DELETE ON generator_circular BEGIN
+        DELETE FROM generator_circular_fts WHERE rowid = old.rowid;
+    END
+    """,
+    # Index the circulars stored before this migration.
+    f"""
+    INSERT INTO generator_circular_fts ({INDEXED_COLUMNS})
+    SELECT {INDEXED_VALUES.replace('new.', '')} FROM generator_circular
+    """,
+]
+
+BACKWARD = [
+    "DROP TRIGGER IF EXISTS generator_circular_fts_delete",
+    "DROP TRIGGER IF EXISTS generator_circular_fts_update",
+    "DROP TRIGGER IF EXISTS generator_circular_fts_insert",
+    "DROP TABLE IF EXISTS generator_circular_fts",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0005_lazy_pdf'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD, BACKWARD),
+    ]
@@ -0,0 +1,94 @@
+from importlib import import_module
+
+from django.db import migrations
+
+# Re-key the archive index (see generator/archive.py) on circular_id.
+#
+# 0006 shared the FTS5 rowid with generator_circular's implicit rowid. Any
+# migration that rebuilds generator_circular (SQLite's AlterField copies the
+# table) renumbers those rowids and drops the triggers, which silently breaks
+# the join and the index. The index now has its own rowids, assigned as rows
+# are indexed, and its triggers find a circular's row by circular_id. The
+# circular_id column is indexed so that lookup is a MATCH rather than a scan;
+# the trailing equality keeps it exact.
+#
+# generator.apps re-creates the triggers after every migrate if a later
+# table rebuild drops them (archive.ensure_index).
+
+INDEXED_VALUES = """
+    new.circular_id,
+    new.subject,
+    new.department,
+    ifnull(json_extract(new.inputs, '$.audience'), ''),
+    ifnull(json_extract(new.inputs, '$.agenda'), ''),
+    ifnull(json_extract(new.inputs, '$.date'), '') || ' ' ||
+        ifnull(json_extract(new.inputs, '$.event_datetime'), '') || ' ' ||
+        ifnull(date(new.created_at), ''),
+    new.text
+"""
+
+INDEXED_COLUMNS = "circular_id, subject, department, audience, agenda, dates, text"
+
+DELETE_OLD = """
+    DELETE FROM generator_circular_fts
+     WHERE rowid IN (SELECT rowid FROM generator_circular_fts
+                      WHERE generator_circular_fts MATCH 'circular_id : "' || replace(old.circular_id, '"', '""') || '"')
+       AND circular_id = old.circular_id;
+"""
+
+DROP = [
+    "DROP TRIGGER IF EXISTS generator_circular_fts_delete",
+    "DROP TRIGGER IF EXISTS generator_circular_fts_update",
+    "DROP TRIGGER IF EXISTS generator_circular_fts_insert",
+    "DROP TABLE IF EXISTS generator_circular_fts",
+]
+
+TRIGGERS = {
+    'generator_circular_fts_insert': f"""
+    CREATE TRIGGER generator_circular_fts_insert AFTER INSERT ON generator_circular BEGIN
+        INSERT INTO generator_circular_fts ({INDEXED_COLUMNS}) VALUES ({INDEXED_VALUES});
+    END
+    """,
+    'generator_circular_fts_update': f"""
+    CREATE TRIGGER generator_circular_fts_update
+    AFTER UPDATE OF circular_id, subject, department, inputs, text ON generator_circular BEGIN
+        {DELETE_OLD}
+        INSERT INTO generator_circular_fts ({INDEXED_COLUMNS}) VALUES ({INDEXED_VALUES});
+    END
+    """,
+    'generator_circular_fts_delete': f"""
+    CREATE TRIGGER generator_circular_fts_delete AFTER DELETE ON generator_circular BEGIN
+        {DELETE_OLD}
+    END
+    """,
+}
+
+# Index every circular, oldest first, so the index's rowids start out in creation order.
+REINDEX = f"""
+    INSERT INTO generator_circular_fts ({INDEXED_COLUMNS})
+    SELECT {INDEXED_VALUES.replace('new.', '')} FROM generator_circular ORDER BY created_at
+"""
+
+FORWARD = DROP + [
+    """
+    CREATE VIRTUAL TABLE generator_circular_fts USING fts5(
+        circular_id, subject, department, audience, agenda, dates, text,
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )
+    """,
+    *TRIGGERS.values(),
+    REINDEX,
+]
+
+BACKWARD = DROP + import_module('generator.migrations.0006_circular_archive').FORWARD
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0006_circular_archive'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD, BACKWARD),
+    ]
@@ -1,3 +1,130 @@
 from django.db import models
 
-# Create your models here.
+
+class Circular(models.Model):
+    """A generated circular: its inputs, text and its cached PDF (see generator/storage.py)."""
+
+    circular_id  = models.CharField(max_length=8, primary_key=True)
+    subject      = models.CharField(max_length=255)
+    department   = models.CharField(max_length=10, blank=True)
+    inputs       = models.JSONField()
+    text         = models.TextField()
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)    # sha256 of the PDF bytes
+    context_hash = models.CharField(max_length=64, blank=True)    # sha256 of the context the PDF was rendered from
+    pdf_size     = models.PositiveIntegerField(default=0)
+    pdf_rendered_at = models.DateTimeField(null=True, blank=True)
+    llm_ms       = models.FloatField(null=True, blank=True)
+    render_ms    = models.FloatField(null=True, blank=True)
+    persist_ms   = models.FloatField(null=True, blank=True)
+    created_at   = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at   = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.circular_id}: {self.subject}"
+
+    @property
+    def pdf_filename(self):
+        """Download/attachment name; the stored object itself is named by content hash."""
+        return f"circular_{self.subject.replace(' ', '_')}.pdf"
+
+
+class CircularJob(models.Model):
+    """A circular queued for background generation (see generator/jobs.py)."""
+
+    QUEUED  = 'queued'
+    RUNNING = 'running'
+    DONE    = 'done'
+    FAILED  = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED,  'Queued'),
+        (RUNNING, 'Running'),
+        (DONE,    'Done'),
+        (FAILED,  'Failed'),
+    ]
+
+    # The job ID doubles as the circular ID printed on the result page.
+    id         = models.CharField(max_length=8, primary_key=True)
+    status     = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    inputs     = models.JSONField()
+    base_url   = models.CharField(max_length=200)
+    use_cache  = models.BooleanField(default=True)    # False = skip cached LLM text
+    result     = models.JSONField(null=True, blank=True)
+    error      = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.id} ({self.status})"
+
+
+class LLMResponse(models.Model):
+    """Persistent tier of the Gemini response cache (see generator/llm_cache.py)."""
+
+    key        = models.CharField(max_length=64, primary_key=True)   # sha256(model, normalized prompt)
+    model      = models.CharField(max_length=100)
+    text       = models.TextField()
+    created_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.model}:{self.key[:12]}"
+
+
+class Distribution(models.Model):
+    """One "send this circular to these people" request (see generator/distribution.py)."""
+
+    QUEUED  = 'queued'
+    SENDING = 'sending'
+    SENT    = 'sent'
+    PARTIAL = 'partial'
+    FAILED  = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED,  'Queued'),
+        (SENDING, 'Sending'),
+        (SENT,    'Sent'),
+        (PARTIAL, 'Partially sent'),
+        (FAILED,  'Failed'),
+    ]
+
+    circular     = models.ForeignKey(Circular, on_delete=models.SET_NULL, null=True, related_name='distributions')
+    subject      = models.CharField(max_length=255)
+    status       = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    created_at   = models.DateTimeField(auto_now_add=True)
+    updated_at   = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.subject} ({self.status})"
+
+
+class Delivery(models.Model):
+    """Delivery state of one recipient of a distribution."""
+
+    PENDING = 'pending'
+    SENT    = 'sent'
+    FAILED  = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT,    'Sent'),
+        (FAILED,  'Failed'),
+    ]
+
+    distribution = models.ForeignKey(Distribution, on_delete=models.CASCADE, related_name='deliveries')
+    recipient    = models.CharField(max_length=254)
+    status       = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    error        = models.TextField(blank=True)
+    attempts     = models.PositiveIntegerField(default=0)
+    sent_at      = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.recipient} ({self.status})"
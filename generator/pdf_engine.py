@@ -0,0 +1,194 @@
+# generator/pdf_engine.py
+"""
+PDF rendering on a pool of warm worker processes.
+
+WeasyPrint layout is CPU-bound, so rendering in the request thread means
+concurrent circulars queue behind each other on the GIL. Instead each
+worker process sets up fonts and parses the shared circular stylesheet
+(``generator/circular.css``) once, then only has to lay out the
+per-circular HTML. ``render_pdf(context)`` is all callers need.
+
+``CIRCULAR_PDF_WORKERS = 0`` renders in-process, which is handy for
+debugging.
+
+WeasyPrint (and with it Pango, cairo and fontconfig) is only imported where
+rendering actually happens, so processes that never render don't load it.
+``warm_up()`` does that work ahead of the first download.
+"""
+
+import os
+import threading
+from concurrent.futures         import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing            import get_context
+
+from django.conf            import settings
+from django.template.loader import render_to_string
+
+from generator        import letterhead
+from generator.assets import url_fetcher
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 1. Per-worker state
+# ─────────────────────────────────────────────────────────────────────────────
+_font_config = None
+_stylesheets = None
+_image_cache = {}     # WeasyPrint image cache, shared by every document this worker renders
+_image_cache_fingerprint = None     # letterhead and asset settings the image cache was filled under
+
+IMAGE_CACHE_LIMIT = 256
+
+
+def _init_worker():
+    global _font_config, _stylesheets
+
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+    from weasyprint            import CSS
+    from weasyprint.text.fonts import FontConfiguration
+
+    _font_config = FontConfiguration()
+    _stylesheets = [
+        CSS(string=render_to_string('generator/circular.css'), font_config=_font_config),
+    ]
+
+
+# WeasyPrint ``write_pdf`` options per quality profile (CIRCULAR_PDF_QUALITY).
+# ``dpi`` caps embedded image resolution; ``full_fonts=False`` embeds only the
+# glyphs used; ``hinting`` keeps font hinting, which only helps on screen.
+QUALITY_PROFILES = {
+    'default': {},      # WeasyPrint's own defaults: images as-is, subset fonts
+    'draft': {
+        'optimize_images': True, 'jpeg_quality': 60, 'dpi': 150,
+        'full_fonts': False, 'hinting': False,
+    },
+    'print': {
+        'optimize_images': True, 'jpeg_quality': 85, 'dpi': 300,
+        'full_fonts': False, 'hinting': False,
+    },
+    'archive': {
+        'optimize_images': False, 'jpeg_quality': None, 'dpi': None,
+        'full_fonts': True, 'hinting': True,
+    },
+}
+
+
+def write_options():
+    profile = getattr(settings, 'CIRCULAR_PDF_QUALITY', 'print')
+    return dict(QUALITY_PROFILES[profile] if isinstance(profile, str) else profile)
+
+
+def render_settings():
+    """The settings besides the context that change a PDF's bytes."""
+    return {
+        'quality':  write_options(),
+        'optimize': getattr(settings, 'CIRCULAR_ASSET_OPTIMIZE', True),
+        'dpi':      getattr(settings, 'CIRCULAR_ASSET_DPI', 300),
+    }
+
+
+def _render(context, base_url):
+    global _image_cache_fingerprint
+    if _stylesheets is None:
+        _init_worker()
+    # The image cache is keyed by URL, so drop it when a bundled logo or
+    # signature, or the way assets are optimized, changes.
+    assets  = render_settings()
+    current = (letterhead.fingerprint(), assets['optimize'], assets['dpi'])
+    if len(_image_cache) > IMAGE_CACHE_LIMIT or current != _image_cache_fingerprint:
+        _image_cache.clear()
+        _image_cache_fingerprint = current
+
+    from weasyprint import HTML
+
+    html_string = render_to_string(
+        'generator/result.html', {**context, 'is_pdf': True}
+    )
+    return HTML(
+        string=html_string, base_url=base_url, url_fetcher=url_fetcher
+    ).write_pdf(
+        stylesheets=_stylesheets, font_config=_font_config, cache=_image_cache,
+        **write_options(),
+    )
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 2. Process pool
+# ─────────────────────────────────────────────────────────────────────────────
+_pool      = None
+_pool_lock = threading.Lock()
+
+
+def pool_size():
+    workers = getattr(settings, 'CIRCULAR_PDF_WORKERS', None)
+    return (os.cpu_count() or 1) if workers is None else workers
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=pool_size(),
+                mp_context=get_context(getattr(settings, 'CIRCULAR_PDF_START_METHOD', 'spawn')),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def _reset_pool(broken):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def submit_pdf(context, base_url=None):
+    """Queue a render and return a ``concurrent.futures.Future`` of the PDF bytes."""
+    if pool_size() == 0:
+        future = Future()
+        try:
+            future.set_result(_render(dict(context), base_url))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+    pool = get_pool()
+    try:
+        return pool.submit(_render, dict(context), base_url)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); start a fresh pool once.
+        _reset_pool(pool)
+        return get_pool().submit(_render, dict(context), base_url)
+
+
+def render_pdf(context, base_url=None):
+    """Render the circular described by ``context`` and return the PDF bytes."""
+    return submit_pdf(context, base_url).result()
+
+
+def _ready():
+    return os.getpid()
+
+
+def warm_up(start_pool=False):
+    """
+    Load WeasyPrint ahead of the first render.
+
+    In-process rendering (``CIRCULAR_PDF_WORKERS = 0``) sets up fonts and the
+    stylesheet right here. With a pool, ``start_pool=True`` starts the worker
+    processes and waits until each has run its initializer; don't do that in
+    a pre-fork master, since the pool can't be shared with forked children.
+    """
+    if pool_size() == 0:
+        if _stylesheets is None:
+            _init_worker()
+        return
+    if start_pool:
+        pool = get_pool()
+        for future in [pool.submit(_ready) for _ in range(pool_size())]:
+            future.result()
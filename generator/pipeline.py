@@ -0,0 +1,474 @@
+# generator/pipeline.py
+"""
+The circular generation pipeline: prompt → LLM text → stored circular → PDF.
+
+Each stage is a plain function so the request views and the background job
+workers (generator/jobs.py) run exactly the same code; async views use the
+``a``-prefixed variants, which await Gemini. The PDF is not part of
+generation: ``ensure_pdf`` renders it the first time someone downloads or
+emails the circular and reuses it for as long as its context is unchanged.
+Edits to a stored circular (``apply_edits``) reuse its text rather than
+asking Gemini again.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+from asgiref.sync import sync_to_async
+from django.conf  import settings
+from django.utils import timezone
+
+from generator                 import gateway, letterhead, llm, llm_cache, storage
+from generator.instrumentation import span
+from generator.models          import Circular, CircularJob
+from generator.pdf_engine      import render_settings, submit_pdf
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 1. HOD Mapping by Department Code
+# ─────────────────────────────────────────────────────────────────────────────
+HOD_BY_DEPT = {
+    'CSE':   'Dr. Nirmala C R',
+    'MECH':  'Dr. G. Manavendra',
+    'CIVIL': 'Dr. Chidananda G',
+    'EEE':   'Dr. M S Nagaraj',
+    'ECE':   'Dr. G.S. Sunitha',
+    'ISE':   'Dr. Poornima B',
+}
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 1b. Department full-name mapping
+# ─────────────────────────────────────────────────────────────────────────────
+DEPT_FULL_BY_CODE = {
+    'CSE':   'Computer Science and Engineering',
+    'MECH':  'Mechanical Engineering',
+    'CIVIL': 'Civil Engineering',
+    'EEE':   'Electrical & Electronics Engineering',
+    'ECE':   'Electronics & Communication Engineering',
+    'ISE':   'Information Science & Engineering',
+}
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 2. Signature URLs on GitHub (raw)
+# ─────────────────────────────────────────────────────────────────────────────
+GITHUB_RAW_BASE = (
+    "https://raw.githubusercontent.com/adarshaadi06/circulargen"
+    "/main/generator/static/generator/signatures"
+)
+
+HOD_SIG_URLS = {
+    'CSE':   "https://github.com/adarshaadi06/circulargen/blob/main/generator/static/generator/signatures/CSE-sign.png?raw=true",
+    'MECH':  "https://raw.githubusercontent.com/adarshaadi06/circulargen/main/generator/static/generator/signatures/MECH-sign.png?raw=true",
+    'CIVIL': "https://raw.githubusercontent.com/adarshaadi06/circulargen/main/generator/static/generator/signatures/CIVIL-sign.png?raw=true",
+    'EEE':   "https://raw.githubusercontent.com/adarshaadi06/circulargen/main/generator/static/generator/signatures/EEE-sign.png?raw=true",
+    # 'ECE':   "https://github.com/adarshaadi06/circulargen/blob/main/generator/static/generator/signatures/ECE-sign.png?raw=true",
+    # 'ISE':   "https://github.com/adarshaadi06/circulargen/blob/main/generator/static/generator/signatures/ISE-sign.png?raw=true",
+}
+
+DIRECTOR_SIG_URL   = f"{GITHUB_RAW_BASE}/director-sign.png?raw=true"
+PRINCIPAL_SIG_URL  = f"{GITHUB_RAW_BASE}/principal-sign.png?raw=true"
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 3. Google Gemini AI: called through generator/gateway.py (client in generator/llm.py)
+# ─────────────────────────────────────────────────────────────────────────────
+GEMINI_MODEL = llm.GEMINI_MODEL
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 4. Pipeline stages
+# ─────────────────────────────────────────────────────────────────────────────
+INPUT_FIELDS = (
+    'subject', 'date', 'audience', 'urgency', 'agenda', 'additional_info',
+    'venue', 'event_datetime', 'department', 'recipient_email',
+)
+
+
+def collect_inputs(data):
+    """Pull the circular fields out of a POST QueryDict (or any mapping)."""
+    return {
+        'subject':         data['subject'],
+        'date':            data['date'],
+        'audience':        data['audience'],
+        'urgency':         data['urgency'],
+        'agenda':          data['agenda'],
+        'additional_info': data['additional_info'],
+        'venue':           data.get('venue', ''),
+        'event_datetime':  data.get('event_datetime', ''),
+        'department':      data['department'],
+        'recipient_email': data['recipient_email'],
+    }
+
+
+def build_prompt(inputs):
+    event_datetime = inputs['event_datetime']
+    return (
+        "Write a formal and concise college circular in one paragraph, "
+        "no bullets in body. Keep Subject on its own line before details. "
+        "After, list Venue, Date, Time as bullets. Do NOT include signatures.\n\n"
+        f"Subject: {inputs['subject']}\n"
+        f"Audience: {inputs['audience']}\n"
+        f"Urgency: {inputs['urgency']}\n"
+        f"Agenda: {inputs['agenda']}\n"
+        f"Details: {inputs['additional_info']}\n\n"
+        f"* Venue: {inputs['venue']}\n"
+        f"* Date: {event_datetime.split(',')[0] if ',' in event_datetime else event_datetime}\n"
+        f"* Time: {event_datetime.split(',')[-1].strip() if ',' in event_datetime else ''}\n\n"
+        "Circular Content:\n"
+    )
+
+
+def demo_text(inputs):
+    event_datetime = inputs['event_datetime']
+    return (
+        f"Subject: {inputs['subject']}\n"
+        f"This is a simulated circular for {inputs['audience']} about '{inputs['agenda']}'. "
+        f"Details: {inputs['additional_info']}.\n"
+        f"* Venue: {inputs['venue']}\n"
+        f"* Date: {event_datetime.split(',')[0]}\n"
+        f"* Time: {event_datetime.split(',')[-1].strip()}\n"
+    )
+
+
+def template_text(inputs):
+    """Plain circular built from the form alone; used when Gemini is unavailable."""
+    date, _, event_time = inputs['event_datetime'].partition(',')
+    details = inputs['additional_info'].strip()
+    return (
+        f"Subject: {inputs['subject']}\n"
+        f"This is to inform {inputs['audience']} regarding {inputs['agenda']}."
+        f"{' ' + details if details else ''}\n"
+        f"* Venue: {inputs['venue']}\n"
+        f"* Date: {date.strip()}\n"
+        f"* Time: {event_time.strip()}\n"
+    )
+
+
+def clean_text(text):
+    return re.sub(r'\*\*(.*?)\*\*', r'\1', text)
+
+
+def generate_text(inputs, prompt, use_cache=True):
+    if llm.is_demo():
+        # Optional artificial latency so benchmarks can stand in for a real Gemini call.
+        time.sleep(getattr(settings, 'CIRCULAR_DEMO_LLM_LATENCY', 0.0))
+        return demo_text(inputs)
+
+    try:
+        text = llm_cache.get_or_generate(
+            GEMINI_MODEL, prompt, lambda: gateway.get_gateway().generate(prompt), bypass=not use_cache
+        )
+    except gateway.Unavailable:
+        return template_text(inputs)
+    return clean_text(text)
+
+
+async def agenerate_text(inputs, prompt, use_cache=True):
+    """``generate_text`` for async views: awaits Gemini instead of holding a thread."""
+    if llm.is_demo():
+        await asyncio.sleep(getattr(settings, 'CIRCULAR_DEMO_LLM_LATENCY', 0.0))
+        return demo_text(inputs)
+
+    try:
+        text = await llm_cache.aget_or_generate(
+            GEMINI_MODEL, prompt, lambda: gateway.get_gateway().agenerate(prompt), bypass=not use_cache
+        )
+    except gateway.Unavailable:
+        return template_text(inputs)
+    return clean_text(text)
+
+
+def stream_text(inputs, prompt, use_cache=True):
+    """
+    Yield the raw circular text in chunks as Gemini produces it.
+    Callers join the chunks and pass them through ``clean_text``.
+    """
+    if llm.is_demo():
+        # Simulate token-by-token output so the streaming UI can be tried offline.
+        delay = getattr(settings, 'CIRCULAR_DEMO_STREAM_DELAY', 0.05)
+        for chunk in re.findall(r'\S+\s*', demo_text(inputs)):
+            time.sleep(delay)
+            yield chunk
+        return
+
+    if use_cache and llm_cache.enabled():
+        cached = llm_cache.get(GEMINI_MODEL, prompt)
+        if cached is not None:
+            yield cached
+            return
+
+    parts = []
+    try:
+        for chunk in gateway.get_gateway().stream(prompt):
+            parts.append(chunk)
+            yield chunk
+    except gateway.Unavailable:
+        yield template_text(inputs)
+        return
+    if llm_cache.enabled():
+        llm_cache.put(GEMINI_MODEL, prompt, ''.join(parts))
+
+
+def build_context(inputs, circular, circular_id):
+    department = inputs['department']
+    return {
+        **inputs,
+        'dept_full':              DEPT_FULL_BY_CODE.get(department, department),
+        'hod_name':               HOD_BY_DEPT.get(department, 'Head of Department'),
+        'hod_signature_url':      HOD_SIG_URLS.get(department, ''),
+        'director_signature_url': DIRECTOR_SIG_URL,
+        'principal_signature_url':PRINCIPAL_SIG_URL,
+        'circular':               circular,
+        'circular_id':            circular_id,
+        'is_pdf':                 False,
+    }
+
+
+def save_circular(inputs, circular, circular_id, llm_ms=None):
+    """Record the circular's inputs and text. Its PDF is rendered later, on demand."""
+    with span('persist'):
+        return Circular.objects.create(
+            circular_id=circular_id,
+            subject=inputs['subject'],
+            department=inputs['department'],
+            inputs=inputs,
+            text=circular,
+            llm_ms=llm_ms,
+        )
+
+
+def circular_context(record):
+    return build_context(record.inputs, record.text, record.circular_id)
+
+
+def context_hash(context):
+    """
+    Hash of everything a PDF is rendered from: the circular's context, the
+    quality and asset settings, and the letterhead templates and assets.
+    It keys the cached PDF and is the download's ETag.
+    """
+    payload = json.dumps(
+        {'context': context, 'render': render_settings(), 'letterhead': letterhead.fingerprint()},
+        sort_keys=True, default=str,
+    ).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+
+def attach_pdf(record, context, pdf_bytes, render_ms=None):
+    """Store ``pdf_bytes`` by content hash as the cached PDF of ``context``."""
+    with span('persist'):
+        started = time.perf_counter()
+        record.content_hash    = storage.store_pdf(pdf_bytes)
+        record.context_hash    = context_hash(context)
+        record.pdf_size        = len(pdf_bytes)
+        record.pdf_rendered_at = timezone.now()
+        record.render_ms       = render_ms
+        record.persist_ms      = (time.perf_counter() - started) * 1000
+        record.save(update_fields=[
+            'content_hash', 'context_hash', 'pdf_size', 'pdf_rendered_at',
+            'render_ms', 'persist_ms', 'updated_at',
+        ])
+
+
+def has_current_pdf(record, context):
+    return (
+        record.content_hash
+        and record.context_hash == context_hash(context)
+        and storage.object_path(record.content_hash).exists()
+    )
+
+
+# Renders in flight, by (circular id, context hash), so a burst of first
+# downloads of a circular produces one PDF, not one per request.
+_renders      = {}      # key → (Future of the PDF bytes, perf_counter at submit)
+_renders_lock = threading.Lock()
+
+
+def _settle(key, future, source):
+    with _renders_lock:
+        _renders.pop(key, None)
+    if source.exception() is not None:
+        future.set_exception(source.exception())
+    else:
+        future.set_result(source.result())
+
+
+def render_future(record, context, base_url=None):
+    """
+    Return ``(future, started)`` for the render of ``context``, joining the
+    render of the same circular and context if one is already in flight.
+    """
+    key = (record.circular_id, context_hash(context))
+    with _renders_lock:
+        entry = _renders.get(key)
+        if entry is not None:
+            return entry
+        entry = _renders[key] = (Future(), time.perf_counter())
+
+    future, _ = entry
+    try:
+        source = submit_pdf(context, base_url)
+    except Exception as exc:
+        source = Future()
+        source.set_exception(exc)
+    source.add_done_callback(lambda done: _settle(key, future, done))
+    return entry
+
+
+def _attach_rendered(record, context, pdf_bytes, started):
+    # Every request that joined the render gets here; only the first stores it.
+    record.refresh_from_db()
+    if not has_current_pdf(record, context):
+        attach_pdf(record, context, pdf_bytes, (time.perf_counter() - started) * 1000)
+    return record.content_hash
+
+
+def ensure_pdf(record, base_url=None):
+    """Render and store the circular's PDF unless the cached one still matches its context."""
+    context = circular_context(record)
+    if has_current_pdf(record, context):
+        return record.content_hash
+
+    future, started = render_future(record, context, base_url)
+    with span('pdf_render'):
+        pdf_bytes = future.result()
+    return _attach_rendered(record, context, pdf_bytes, started)
+
+
+async def aensure_pdf(record, base_url=None):
+    """``ensure_pdf`` for async views: the event loop awaits the render instead of blocking on it."""
+    context = await sync_to_async(circular_context)(record)
+    if await sync_to_async(has_current_pdf)(record, context):
+        return record.content_hash
+
+    # Submitting may render inline (CIRCULAR_PDF_WORKERS = 0), so do it off the loop.
+    future, started = await sync_to_async(render_future, thread_sensitive=False)(record, context, base_url)
+    with span('pdf_render'):
+        pdf_bytes = await asyncio.wrap_future(future)
+    return await sync_to_async(_attach_rendered)(record, context, pdf_bytes, started)
+
+
+def run(inputs, circular_id, use_cache=True):
+    """Generate and store the circular text and return the result-page context."""
+    started = time.perf_counter()
+    with span('prompt_build'):
+        prompt = build_prompt(inputs)
+    with span('llm'):
+        circular = generate_text(inputs, prompt, use_cache=use_cache)
+    llm_ms = (time.perf_counter() - started) * 1000
+
+    save_circular(inputs, circular, circular_id, llm_ms)
+    return build_context(inputs, circular, circular_id)
+
+
+async def arun(inputs, circular_id, use_cache=True):
+    """``run`` for async views."""
+    started = time.perf_counter()
+    with span('prompt_build'):
+        prompt = build_prompt(inputs)
+    with span('llm'):
+        circular = await agenerate_text(inputs, prompt, use_cache=use_cache)
+    llm_ms = (time.perf_counter() - started) * 1000
+
+    await sync_to_async(save_circular)(inputs, circular, circular_id, llm_ms)
+    return build_context(inputs, circular, circular_id)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 5. Edits to a stored circular (no Gemini call)
+# ─────────────────────────────────────────────────────────────────────────────
+# Fields the generated prose may also quote, which are not substituted.
+PROSE_FIELDS = {'audience': 'Audience', 'agenda': 'Agenda', 'additional_info': 'Details'}
+
+
+def quoted_values(inputs):
+    """
+    The values quoted on the labelled lines ``build_prompt`` asks for. Field
+    edits are substituted on these lines only; prose is never rewritten.
+    """
+    date, _, event_time = inputs.get('event_datetime', '').partition(',')
+    return {
+        'Subject': inputs.get('subject', ''),
+        'Venue':   inputs.get('venue', ''),
+        'Date':    date.strip(),
+        'Time':    event_time.strip(),
+    }
+
+
+def substitute(text, old, new):
+    """
+    Replace the old field values quoted on the ``Subject:``, ``* Venue:``,
+    ``* Date:`` and ``* Time:`` lines of ``text`` with the new ones.
+    Returns ``(text, labels)``, where ``labels`` are the changed lines that
+    could not be updated because the line is missing or doesn't quote the
+    old value.
+    """
+    before, after = quoted_values(old), quoted_values(new)
+    missed = []
+    for label, old_value in before.items():
+        new_value = after[label]
+        if old_value == new_value:
+            continue
+        line  = re.compile(rf'^([ \t]*(?:[*\-•][ \t]*)?{label}[ \t]*:)(.*)$', re.M | re.I)
+        value = re.compile(rf'(?<!\w){re.escape(old_value)}(?!\w)') if old_value else None
+        found = False
+
+        def replace(match):
+            nonlocal found
+            if value is None or not value.search(match.group(2)):
+                return match.group(0)
+            found = True
+            return match.group(1) + value.sub(lambda m: new_value, match.group(2))
+
+        text = line.sub(replace, text)
+        if not found:
+            missed.append(label)
+    return text, missed
+
+
+def edit_notice(old, new, missed):
+    """What the user should check in the text after a field-only edit, or ``''``."""
+    changed = [label for field, label in PROSE_FIELDS.items() if old.get(field) != new.get(field)]
+    changed += missed
+    if not changed:
+        return ''
+    return (
+        f"The text was not updated for the changed {', '.join(changed)}. "
+        "Edit the circular text if it mentions the old value."
+    )
+
+
+def apply_edits(record, changes, text=None):
+    """
+    Apply edited fields and/or edited text to a stored circular and return
+    the result-page context.
+
+    Gemini is not called. If only fields were edited, the old values on the
+    ``Subject:``, ``* Venue:``, ``* Date:`` and ``* Time:`` lines are
+    replaced (see ``substitute``). Anything else, such as the audience or
+    agenda in the body, is left alone and listed in the page's
+    ``edit_notice``. Edited ``text`` is kept as written. The PDF is not
+    rendered here: the context hash changes, so ``ensure_pdf`` re-renders it
+    on the next download or email.
+    """
+    inputs = {**record.inputs, **{k: v for k, v in changes.items() if k in INPUT_FIELDS}}
+    text   = None if text is None else text.replace('\r\n', '\n')
+    notice = ''
+    if text is None or text == record.text:
+        text, missed = substitute(record.text, record.inputs, inputs)
+        notice       = edit_notice(record.inputs, inputs, missed)
+
+    if inputs != record.inputs or text != record.text:
+        with span('persist'):
+            record.subject    = inputs['subject']
+            record.department = inputs['department']
+            record.inputs     = inputs
+            record.text       = text
+            record.save(update_fields=['subject', 'department', 'inputs', 'text', 'updated_at'])
+            context = circular_context(record)
+            # Keep the background job's stored result page in step with the edit.
+            CircularJob.objects.filter(pk=record.circular_id, status=CircularJob.DONE).update(result=context)
+        return {**context, 'edit_notice': notice}
+    return circular_context(record)
@@ -0,0 +1,88 @@
+# generator/storage.py
+"""
+Content-addressed PDF storage.
+
+A PDF is stored once under its SHA-256, sharded two levels deep so no
+directory grows unbounded::
+
+    generated_pdfs/objects/3f/a2/3fa2…e9.pdf
+
+``Circular.content_hash`` points at the object, so identical output is
+stored once and a download is a single path computation, not a directory
+scan. Objects no longer referenced by any circular are removed by
+``manage.py prune_circulars``.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+
+def pdf_root():
+    return Path(getattr(settings, 'CIRCULAR_PDF_ROOT', settings.BASE_DIR / 'generated_pdfs'))
+
+
+def object_path(digest):
+    return pdf_root() / 'objects' / digest[:2] / digest[2:4] / f"{digest}.pdf"
+
+
+def write_atomic(path, data):
+    """
+    Write ``data`` to ``path`` via a uniquely named temp file in the same
+    directory, so concurrent writers (threads or processes) never see or
+    clobber a half-written file. Content-addressed callers write identical
+    bytes, so if the rename fails but ``path`` exists, that is success.
+    """
+    os.makedirs(path.parent, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=f".{path.name}.", suffix='.tmp', delete=False
+    ) as tmp:
+        tmp.write(data)
+    try:
+        os.replace(tmp.name, path)
+    except OSError:
+        os.unlink(tmp.name)
+        if not path.exists():
+            raise
+
+
+def store_pdf(pdf_bytes):
+    """Store ``pdf_bytes`` (if not already present) and return its digest."""
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    path   = object_path(digest)
+    if not path.exists():
+        write_atomic(path, pdf_bytes)
+    return digest
+
+
+def read_pdf(digest):
+    return object_path(digest).read_bytes()
+
+
+def iter_objects():
+    objects_dir = pdf_root() / 'objects'
+    if objects_dir.is_dir():
+        yield from objects_dir.glob('*/*/*.pdf')
+
+
+def sweep(referenced, min_age=3600, dry_run=False):
+    """
+    Delete stored objects whose digest is not in ``referenced``.
+
+    Objects younger than ``min_age`` seconds are kept so a PDF written just
+    before its ``Circular`` row is saved is never collected. Returns the
+    list of removed (or, with ``dry_run``, removable) paths.
+    """
+    cutoff  = time.time() - min_age
+    removed = []
+    for path in iter_objects():
+        if path.stem in referenced or path.stat().st_mtime > cutoff:
+            continue
+        removed.append(path)
+        if not dry_run:
+            path.unlink(missing_ok=True)
+    return removed
@@ -0,0 +1,160 @@
+# generator/streaming.py
+"""
+Server-Sent Events for streaming circular generation.
+
+The browser opens an ``EventSource`` on the events URL and receives:
+
+* ``chunk`` – a piece of circular text, as soon as Gemini produces it;
+* ``done``  – once the text is complete and the PDF has been rendered and
+  stored, with the final cleaned text and the links the result page needs;
+* ``error`` – if anything failed along the way.
+
+The form inputs travel in a signed token on the events URL because
+``EventSource`` can only issue GET requests. The token stays valid for
+``TOKEN_MAX_AGE``, so a reload or a reconnecting proxy can replay it. Once
+its circular has been stored, a replay gets the stored text and ``done``
+instead of a second generation.
+
+``event_stream`` is a plain generator, which is what WSGI servers iterate.
+Django's ASGI handler would collect a sync iterator in full before sending
+any of it, so under ASGI the view wraps it in ``aiterate``: the generator
+runs on a thread of its own and each event is sent as soon as it is made.
+"""
+
+import asyncio
+import contextvars
+import json
+import threading
+
+from django.core import signing
+from django.db   import IntegrityError, connections, transaction
+from django.urls import reverse
+
+from generator                 import pipeline
+from generator.instrumentation import span
+from generator.models          import Circular, CircularJob
+
+TOKEN_SALT    = 'generator.streaming'
+TOKEN_MAX_AGE = 15 * 60
+
+
+def make_token(inputs, circular_id, use_cache=True):
+    return signing.dumps(
+        {'inputs': inputs, 'circular_id': circular_id, 'use_cache': use_cache},
+        salt=TOKEN_SALT, compress=True,
+    )
+
+
+def read_token(token):
+    """Return the payload of ``token``; raises ``signing.BadSignature`` if invalid or expired."""
+    return signing.loads(token, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE)
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _done(circular, circular_id):
+    return sse('done', {
+        'circular':     circular,
+        'circular_id':  circular_id,
+        'pdf_url':      reverse('circular_pdf', args=[circular_id]),
+        'result_url':   reverse('circular_job_result', args=[circular_id]),
+    })
+
+
+def _replay(record):
+    yield sse('chunk', {'text': record.text})
+    yield _done(record.text, record.circular_id)
+
+
+def event_stream(inputs, circular_id, base_url, use_cache=True):
+    # An initial comment line makes proxies flush headers straight away.
+    yield ": stream open\n\n"
+    try:
+        stored = Circular.objects.filter(pk=circular_id).first()
+        if stored is not None:
+            yield from _replay(stored)
+            return
+
+        with span('prompt_build'):
+            prompt = pipeline.build_prompt(inputs)
+        parts = []
+        with span('llm'):
+            for chunk in pipeline.stream_text(inputs, prompt, use_cache=use_cache):
+                parts.append(chunk)
+                yield sse('chunk', {'text': chunk})
+
+        circular = pipeline.clean_text(''.join(parts))
+        context  = pipeline.build_context(inputs, circular, circular_id)
+        try:
+            with transaction.atomic():
+                record = pipeline.save_circular(inputs, circular, circular_id)
+        except IntegrityError:
+            # A concurrent replay of the same token stored it first.
+            yield _done(Circular.objects.get(pk=circular_id).text, circular_id)
+            return
+        pipeline.ensure_pdf(record, base_url)
+
+        # Record it like a finished background job so the result page can be revisited.
+        CircularJob.objects.update_or_create(
+            id=circular_id,
+            defaults={
+                'status':    CircularJob.DONE,
+                'inputs':    inputs,
+                'base_url':  base_url,
+                'use_cache': use_cache,
+                'result':    context,
+            },
+        )
+        yield _done(circular, circular_id)
+    except Exception as exc:
+        yield sse('error', {'error': f"{type(exc).__name__}: {exc}"})
+
+
+async def aiterate(iterable, buffer=4):
+    """
+    Async iterator over the blocking ``iterable``, which runs on a thread of
+    its own (so its database connections stay on that thread and are closed
+    when it ends). Items are passed on as they are produced, with at most
+    ``buffer`` waiting to be sent. If the consumer stops early, e.g. the
+    client disconnects, the iterable is closed after its next item.
+    """
+    loop   = asyncio.get_running_loop()
+    queue  = asyncio.Queue(maxsize=buffer)
+    closed = threading.Event()
+
+    def put(kind, value=None):
+        asyncio.run_coroutine_threadsafe(queue.put((kind, value)), loop).result()
+
+    def produce():
+        try:
+            for item in iterable:
+                if closed.is_set():
+                    return
+                put('item', item)
+        except Exception as exc:
+            outcome = ('error', exc)
+        else:
+            outcome = ('done', None)
+        finally:
+            getattr(iterable, 'close', lambda: None)()
+            connections.close_all()
+        if not closed.is_set():
+            put(*outcome)
+
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(produce,), name='circular-stream', daemon=True).start()
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == 'done':
+                return
+            if kind == 'error':
+                raise value
+            yield value
+    finally:
+        closed.set()
+        # Unblock a producer waiting for room, so it can see ``closed``.
+        while not queue.empty():
+            queue.get_nowait()
@@ -0,0 +1,11 @@
+from django import template
+
+from generator import letterhead as fragments
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def letterhead(context, name):
+    """Insert a cached letterhead fragment (see generator/letterhead.py)."""
+    return fragments.fragment(name, context)
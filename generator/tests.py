@@ -1,3 +1,1112 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import re
+import shutil
+import smtplib
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import Future
+from datetime      import timedelta
+from types         import SimpleNamespace
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync                      import iscoroutinefunction, sync_to_async
+from django.conf                       import settings
+from django.contrib.auth.models        import AnonymousUser, User
+from django.core                       import mail
+from django.core.mail.backends.smtp    import EmailBackend as SMTPBackend
+from django.db                         import connection
+from django.http                       import HttpResponse
+from django.test  import AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls  import reverse
+from django.utils import timezone
+
+from generator        import archive, assets, batch, distribution, gateway, jobs, letterhead, llm, llm_cache, pipeline, storage, streaming
+from generator.instrumentation import span
+from generator.middleware      import LoginRequiredMiddleware, ServerTimingMiddleware
+from generator.models import Circular, CircularJob, Delivery, Distribution, LLMResponse
+
+INPUTS = {
+    'subject':         'Exam Notice',
+    'date':            '01-01-2026',
+    'audience':        'Students',
+    'urgency':         'Urgent',
+    'agenda':          'Exams',
+    'additional_info': 'Bring ID',
+    'venue':           'Hall A',
+    'event_datetime':  '02-01-2026, 10:00 AM',
+    'department':      'CSE',
+    'recipient_email': 'a@example.com',
+}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Background jobs
+# ─────────────────────────────────────────────────────────────────────────────
+# run_job closes old connections itself, which a TestCase transaction can't survive.
+class JobRecoveryTests(TransactionTestCase):
+
+    def make_job(self, status, age):
+        job = CircularJob.objects.create(id='JOB00001', status=status, inputs=INPUTS, base_url='/')
+        CircularJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - age)
+        return job
+
+    @override_settings(CIRCULAR_JOB_STALE_AFTER=600)
+    def test_stale_running_job_is_requeued(self):
+        job = self.make_job(CircularJob.RUNNING, timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CircularJob.QUEUED)
+
+    @override_settings(CIRCULAR_JOB_STALE_AFTER=600)
+    def test_recent_running_job_is_left_alone(self):
+        job = self.make_job(CircularJob.RUNNING, timedelta(seconds=5))
+        self.assertEqual(jobs.requeue_stale(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CircularJob.RUNNING)
+
+    @override_settings(CIRCULAR_JOB_STALE_AFTER=600)
+    def test_heartbeat_keeps_a_live_job_claimed(self):
+        job = self.make_job(CircularJob.RUNNING, timedelta(hours=1))
+        with patch.object(jobs, '_running', {job.pk}):
+            jobs.beat()
+        job.refresh_from_db()
+        self.assertEqual(job.status, CircularJob.RUNNING)
+        self.assertLess(timezone.now() - job.updated_at, timedelta(minutes=1))
+
+    @override_settings(CIRCULAR_JOB_STALE_AFTER=600)
+    def test_heartbeat_reruns_a_dead_process_job(self):
+        job = self.make_job(CircularJob.RUNNING, timedelta(hours=1))
+        with patch.object(jobs, 'get_executor') as get_executor:
+            jobs.beat()
+        get_executor.return_value.submit.assert_called_once_with(jobs.run_job, job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CircularJob.QUEUED)
+
+    def test_requeued_job_reuses_a_circular_it_already_stored(self):
+        job = self.make_job(CircularJob.QUEUED, timedelta(0))
+        pipeline.save_circular(INPUTS, 'Stored text', job.pk)
+        jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CircularJob.DONE)
+        self.assertEqual(job.result['circular'], 'Stored text')
+        self.assertEqual(Circular.objects.count(), 1)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Email distribution
+# ─────────────────────────────────────────────────────────────────────────────
+class RefusingSMTP(smtplib.SMTP):
+    """An unconnected SMTP client whose server refuses some addresses."""
+
+    def __init__(self, refuse=()):
+        super().__init__()
+        self.refuse   = set(refuse)
+        self.messages = []
+
+    def sendmail(self, from_addr, to_addrs, msg, *args, **kwargs):
+        refused = {addr: (550, b'No such user') for addr in to_addrs if addr in self.refuse}
+        if len(refused) == len(to_addrs):
+            raise smtplib.SMTPRecipientsRefused(refused)
+        self.messages.append((to_addrs, msg))
+        return refused
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    DEFAULT_FROM_EMAIL='office@example.com',
+    CIRCULAR_EMAIL_BATCH_SIZE=2,
+    CIRCULAR_EMAIL_RATE=None,
+)
+class DistributionTests(TransactionTestCase):
+
+    RECIPIENTS = ['a@example.com', 'b@example.com', 'c@example.com', 'd@example.com', 'e@example.com']
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.enterContext(override_settings(CIRCULAR_PDF_ROOT=root))
+        circular = pipeline.save_circular(INPUTS, 'Body', 'CIRC0001')
+        pipeline.attach_pdf(circular, pipeline.circular_context(circular), b'%PDF-1.7 test')
+        self.distribution = distribution.create(circular, circular.subject, self.RECIPIENTS)
+
+    def statuses(self):
+        return dict(self.distribution.deliveries.values_list('recipient', 'status'))
+
+    def test_recipients_are_batched_and_bccd(self):
+        distribution.send(self.distribution.pk)
+
+        self.assertEqual([m.bcc for m in mail.outbox], [self.RECIPIENTS[0:2], self.RECIPIENTS[2:4], self.RECIPIENTS[4:]])
+        self.assertTrue(all(m.to == [] for m in mail.outbox))
+        self.assertNotIn('a@example.com', mail.outbox[0].message()['To'])
+        self.distribution.refresh_from_db()
+        self.assertEqual(self.distribution.status, Distribution.SENT)
+
+    def test_refused_recipients_fail_individually_and_retry_resends_only_them(self):
+        smtp    = RefusingSMTP(refuse={'b@example.com', 'e@example.com'})
+        backend = SMTPBackend(host='localhost')
+        backend.connection = smtp
+        distribution.send(self.distribution.pk, connection=backend)
+
+        statuses = self.statuses()
+        self.assertEqual(statuses['b@example.com'], Delivery.FAILED)
+        self.assertEqual(statuses['e@example.com'], Delivery.FAILED)
+        self.assertEqual({r for r, s in statuses.items() if s == Delivery.SENT}, {'a@example.com', 'c@example.com', 'd@example.com'})
+        self.assertIn('550', self.distribution.deliveries.get(recipient='b@example.com').error)
+        self.distribution.refresh_from_db()
+        self.assertEqual(self.distribution.status, Distribution.PARTIAL)
+
+        # The retry goes through locmem and only carries the two failures.
+        Distribution.objects.filter(pk=self.distribution.pk).update(status=Distribution.QUEUED)
+        distribution.send(self.distribution.pk)
+        self.assertEqual([m.bcc for m in mail.outbox], [['b@example.com', 'e@example.com']])
+        self.assertEqual(set(self.statuses().values()), {Delivery.SENT})
+
+    def test_a_distribution_being_sent_is_not_sent_again(self):
+        Distribution.objects.filter(pk=self.distribution.pk).update(status=Distribution.SENDING)
+        self.assertFalse(distribution.submit(self.distribution))
+        distribution.send(self.distribution.pk)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(set(self.statuses().values()), {Delivery.PENDING})
+
+    @override_settings(CIRCULAR_EMAIL_STALE_AFTER=300)
+    def test_a_send_whose_process_died_is_requeued_and_sent(self):
+        Distribution.objects.filter(pk=self.distribution.pk).update(
+            status=Distribution.SENDING, updated_at=timezone.now() - timedelta(hours=1)
+        )
+        with patch.object(distribution, 'get_executor') as get_executor:
+            self.assertEqual(distribution.requeue_stale(), 1)
+        get_executor.return_value.submit.assert_called_once_with(distribution.send, self.distribution.pk)
+
+        distribution.send(self.distribution.pk)
+        self.assertEqual(set(self.statuses().values()), {Delivery.SENT})
+        self.distribution.refresh_from_db()
+        self.assertEqual(self.distribution.status, Distribution.SENT)
+
+    @override_settings(CIRCULAR_EMAIL_STALE_AFTER=300)
+    def test_a_recent_send_is_not_requeued_but_a_stale_one_can_be_retried(self):
+        Distribution.objects.filter(pk=self.distribution.pk).update(status=Distribution.SENDING)
+        with patch.object(distribution, 'get_executor') as get_executor:
+            self.assertEqual(distribution.requeue_stale(), 0)
+        get_executor.return_value.submit.assert_not_called()
+
+        Distribution.objects.filter(pk=self.distribution.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        with patch.object(distribution, 'get_executor'):
+            self.assertTrue(distribution.submit(self.distribution))
+        self.distribution.refresh_from_db()
+        self.assertEqual(self.distribution.status, Distribution.QUEUED)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Streaming generation
+# ─────────────────────────────────────────────────────────────────────────────
+class AIterateTests(TestCase):
+
+    def test_items_are_passed_on_as_they_are_produced(self):
+        received = threading.Event()
+
+        def produce():
+            yield 'first'
+            yield 'second' if received.wait(5) else 'buffered'
+
+        async def consume():
+            items = []
+            async for item in streaming.aiterate(produce()):
+                items.append(item)
+                received.set()
+            return items
+
+        self.assertEqual(asyncio.run(consume()), ['first', 'second'])
+
+    def test_stopping_early_closes_the_iterable(self):
+        finished = threading.Event()
+
+        def produce():
+            try:
+                while True:
+                    yield 'item'
+            finally:
+                finished.set()
+
+        async def consume():
+            stream = streaming.aiterate(produce())
+            async for _ in stream:
+                break
+            await stream.aclose()
+
+        asyncio.run(consume())
+        self.assertTrue(finished.wait(5))
+
+    def test_errors_are_raised_to_the_consumer(self):
+        def produce():
+            yield 'item'
+            raise ValueError('broken')
+
+        async def consume():
+            return [item async for item in streaming.aiterate(produce())]
+
+        with self.assertRaisesMessage(ValueError, 'broken'):
+            asyncio.run(consume())
+
+
+@override_settings(CIRCULAR_DEMO_STREAM_DELAY=0)
+class AsyncEventStreamTests(TransactionTestCase):
+
+    async def test_events_are_streamed_asynchronously_under_asgi(self):
+        user   = await User.objects.acreate(username='streamer')
+        client = AsyncClient()
+        await client.aforce_login(user)
+        token  = streaming.make_token(INPUTS, 'ASYNC001')
+
+        with patch.object(pipeline, 'ensure_pdf'):
+            response = await client.get(reverse('circular_events'), {'token': token})
+            self.assertTrue(response.is_async)
+            events = [chunk.decode() async for chunk in response.streaming_content]
+
+        self.assertEqual(events[0], ': stream open\n\n')
+        self.assertGreater(sum(event.startswith('event: chunk') for event in events), 1)
+        self.assertTrue(events[-1].startswith('event: done'))
+        self.assertTrue(await Circular.objects.filter(pk='ASYNC001').aexists())
+
+
+class EventStreamReplayTests(TestCase):
+
+    def test_replayed_token_streams_the_stored_circular(self):
+        pipeline.save_circular(INPUTS, 'Stored text', 'STREAM01')
+        events = list(streaming.event_stream(INPUTS, 'STREAM01', 'http://testserver/'))
+
+        self.assertIn(streaming.sse('chunk', {'text': 'Stored text'}), events)
+        self.assertTrue(events[-1].startswith('event: done'))
+        self.assertIn('"circular": "Stored text"', events[-1])
+        self.assertEqual(Circular.objects.filter(pk='STREAM01').count(), 1)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Field edits
+# ─────────────────────────────────────────────────────────────────────────────
+class ApplyEditsTests(TestCase):
+
+    TEXT = (
+        "Subject: Exam Notice\n"
+        "All Students are informed that the Exam Notice schedule is out. Meet at Hall A.\n"
+        "* Venue: Hall A\n"
+        "* Date: 02-01-2026\n"
+        "* Time: 10:00 AM\n"
+    )
+
+    def setUp(self):
+        self.record = pipeline.save_circular(INPUTS, self.TEXT, 'EDIT0001')
+
+    def test_only_the_labelled_lines_are_substituted(self):
+        context = pipeline.apply_edits(self.record, {
+            'subject': 'Lab Notice', 'venue': 'Hall B', 'event_datetime': '03-01-2026, 11:00 AM',
+        })
+        self.assertEqual(context['circular'], (
+            "Subject: Lab Notice\n"
+            "All Students are informed that the Exam Notice schedule is out. Meet at Hall A.\n"
+            "* Venue: Hall B\n"
+            "* Date: 03-01-2026\n"
+            "* Time: 11:00 AM\n"
+        ))
+        self.assertEqual(context['edit_notice'], '')
+
+    def test_unsubstituted_changes_leave_the_text_and_are_reported(self):
+        context = pipeline.apply_edits(self.record, {'audience': 'Faculty', 'agenda': 'Results'})
+        self.assertEqual(context['circular'], self.TEXT)
+        self.assertIn('Audience, Agenda', context['edit_notice'])
+
+    def test_a_missing_line_is_reported(self):
+        self.record.text = self.TEXT.replace('* Venue: Hall A\n', '')
+        self.record.save()
+        context = pipeline.apply_edits(self.record, {'venue': 'Hall B'})
+        self.assertEqual(context['circular'], self.record.text)
+        self.assertIn('Venue', context['edit_notice'])
+
+    def test_edited_text_is_kept_as_written(self):
+        context = pipeline.apply_edits(self.record, {'venue': 'Hall B'}, 'New text\r\n')
+        self.assertEqual(context['circular'], 'New text\n')
+        self.assertEqual(context['edit_notice'], '')
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PDF storage
+# ─────────────────────────────────────────────────────────────────────────────
+class StorePDFTests(TestCase):
+
+    def test_concurrent_stores_of_identical_bytes(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        errors = []
+
+        def store(barrier, data):
+            barrier.wait()
+            try:
+                storage.store_pdf(data)
+            except Exception as exc:
+                errors.append(exc)
+
+        with override_settings(CIRCULAR_PDF_ROOT=root):
+            for trial in range(20):
+                data    = b'%PDF-1.7 ' + str(trial).encode() * 2_000_000
+                barrier = threading.Barrier(8)
+                threads = [threading.Thread(target=store, args=(barrier, data)) for _ in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertEqual(storage.read_pdf(storage.store_pdf(data)), data)
+
+            self.assertEqual(errors, [])
+            self.assertEqual(len(list(storage.iter_objects())), 20)
+            self.assertEqual(list(storage.pdf_root().rglob('*.tmp')), [])
+
+    def test_concurrent_variant_builds(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        source  = assets.ASSET_DIR / 'img' / 'biet-seal.png'
+        barrier = threading.Barrier(8)
+        results, errors = [], []
+
+        def build():
+            barrier.wait()
+            try:
+                results.append(assets._build_variant(source, (30, 20), 300))
+            except Exception as exc:
+                errors.append(exc)
+
+        with override_settings(CIRCULAR_ASSET_CACHE_DIR=root):
+            threads = [threading.Thread(target=build) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(errors, [])
+            self.assertEqual(len(set(results)), 1)
+            self.assertEqual(list(assets._variant_dir().glob('*.tmp')), [])
+            self.assertEqual(len(list(assets._variant_dir().iterdir())), 1)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PDF cache key
+# ─────────────────────────────────────────────────────────────────────────────
+class ContextHashTests(TestCase):
+
+    def setUp(self):
+        self.context = pipeline.build_context(INPUTS, 'Body', 'HASH0001')
+
+    def test_changes_with_the_quality_profile(self):
+        with override_settings(CIRCULAR_PDF_QUALITY='print'):
+            printed = pipeline.context_hash(self.context)
+        with override_settings(CIRCULAR_PDF_QUALITY='draft'):
+            self.assertNotEqual(pipeline.context_hash(self.context), printed)
+
+    def test_changes_with_the_letterhead_assets(self):
+        before = pipeline.context_hash(self.context)
+        with patch.object(letterhead, 'fingerprint', return_value='new-signature'):
+            self.assertNotEqual(pipeline.context_hash(self.context), before)
+
+    def test_letterhead_fingerprint_is_stable(self):
+        self.assertEqual(letterhead._compute_fingerprint(), letterhead._compute_fingerprint())
+        self.assertRegex(letterhead._compute_fingerprint(), r'^[0-9a-f]{64}$')
+
+
+class LetterheadTemplateEditTests(TestCase):
+
+    def test_edited_fragment_template_is_rendered(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        template = f"{root}/header.html"
+        with open(template, 'w') as f:
+            f.write('Old {{ dept_full }}')
+
+        self.enterContext(override_settings(
+            TEMPLATES=[{'BACKEND': 'django.template.backends.django.DjangoTemplates', 'DIRS': [root], 'APP_DIRS': True}],
+            CIRCULAR_LETTERHEAD_CHECK_INTERVAL=0,
+        ))
+        self.enterContext(patch.dict(letterhead.FRAGMENTS, {'header': ('header.html', ('dept_full',))}))
+        self.enterContext(patch.object(letterhead, '_fragments', {}))
+        self.enterContext(patch.object(letterhead, '_fingerprint', None))
+        self.enterContext(patch.object(letterhead, '_checked_at', None))
+
+        self.assertEqual(letterhead.fragment('header', {'dept_full': 'CSE'}), 'Old CSE')
+        with open(template, 'w') as f:
+            f.write('New header {{ dept_full }}')
+        self.assertEqual(letterhead.fragment('header', {'dept_full': 'CSE'}), 'New header CSE')
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PDF downloads
+# ─────────────────────────────────────────────────────────────────────────────
+class PDFDownloadTests(TransactionTestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.enterContext(override_settings(CIRCULAR_PDF_ROOT=root))
+        self.user = User.objects.create(username='downloader')
+        pipeline.save_circular(INPUTS, 'Body', 'PDF00001')
+
+    async def test_download_is_rendered_once_and_revalidated_by_etag(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        url = reverse('circular_pdf', args=['PDF00001'])
+
+        with patch.object(pipeline, 'submit_pdf', side_effect=fake_pdf) as submit:
+            response = await client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), b'%PDF Exam Notice')
+            response.close()
+
+            again = await client.get(url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['Last-Modified'], response['Last-Modified'])
+        self.assertEqual(submit.call_count, 1)
+
+    async def test_the_render_is_awaited_off_the_event_loop(self):
+        record  = await Circular.objects.aget(pk='PDF00001')
+        pending = Future()
+        with patch.object(pipeline, 'submit_pdf', return_value=pending):
+            download = asyncio.ensure_future(pipeline.aensure_pdf(record))
+            await asyncio.sleep(0.1)
+            self.assertFalse(download.done())
+            pending.set_result(b'%PDF')
+            digest = await download
+        self.assertEqual(storage.read_pdf(digest), b'%PDF')
+
+    def test_concurrent_renders_of_a_circular_are_shared(self):
+        record  = Circular.objects.get(pk='PDF00001')
+        context = pipeline.circular_context(record)
+        pending = Future()
+        with patch.object(pipeline, 'submit_pdf', return_value=pending) as submit:
+            first  = pipeline.render_future(record, context)
+            second = pipeline.render_future(record, context)
+        self.assertIs(first, second)
+        self.assertEqual(submit.call_count, 1)
+
+        pending.set_result(b'%PDF')
+        self.assertEqual(first[0].result(), b'%PDF')
+        self.assertEqual(pipeline._renders, {})
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Gemini gateway (fake upstream)
+# ─────────────────────────────────────────────────────────────────────────────
+class Upstream5xx(Exception):
+    code = 503
+
+
+class Upstream400(Exception):
+    code = 400
+
+
+class FakeBackend:
+    """Stands in for generator/llm.py; each call takes the next outcome (default: 'ok')."""
+
+    def __init__(self, *outcomes, delay=0.0, release=None):
+        self.outcomes = list(outcomes)
+        self.delay    = delay
+        self.release  = release
+        self.calls    = 0
+
+    def _next(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else 'ok'
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    def generate(self, prompt, timeout=None):
+        if self.release is not None:
+            self.release.wait(5)
+        return self._next()
+
+    async def agenerate(self, prompt, timeout=None):
+        await asyncio.sleep(self.delay)
+        return self._next()
+
+    def stream(self, prompt, timeout=None):
+        yield self._next()
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@override_settings(
+    CIRCULAR_LLM_RATE=None,
+    CIRCULAR_LLM_RETRIES=2,
+    CIRCULAR_LLM_BACKOFF=0,
+    CIRCULAR_LLM_BREAKER_THRESHOLD=3,
+    CIRCULAR_LLM_BREAKER_RESET=30.0,
+)
+class GatewayTests(TestCase):
+
+    def test_retries_transient_errors(self):
+        backend = FakeBackend(TimeoutError(), Upstream5xx(), 'text')
+        gw      = gateway.Gateway(backend)
+        self.assertEqual(gw.generate('p'), 'text')
+        self.assertEqual(backend.calls, 3)
+        self.assertEqual(gw.stats()['retries'], 2)
+
+    def test_exhausted_retries_raise_unavailable(self):
+        backend = FakeBackend(TimeoutError(), TimeoutError(), TimeoutError(), 'never')
+        gw      = gateway.Gateway(backend)
+        with self.assertRaises(gateway.Unavailable):
+            gw.generate('p')
+        self.assertEqual(backend.calls, 3)
+        self.assertEqual(gw.stats()['failures'], 1)
+
+    def test_rejections_raise_unavailable_without_retrying_or_opening_the_breaker(self):
+        for error in (Upstream400('bad request'), ValueError('response.text: blocked by safety')):
+            backend = FakeBackend(error, error, error)
+            gw      = gateway.Gateway(backend)
+            for _ in range(3):
+                with self.assertRaises(gateway.Unavailable):
+                    gw.generate('p')
+            self.assertEqual(backend.calls, 3)
+            self.assertEqual(gw.breaker.state, gateway.CircuitBreaker.CLOSED)
+            self.assertEqual(gw.stats()['rejected'], 3)
+
+    def test_breaker_opens_then_lets_one_probe_through(self):
+        clock   = FakeClock()
+        backend = FakeBackend(*[Upstream5xx()] * 3)
+        gw      = gateway.Gateway(backend)
+        gw.breaker.clock = clock
+        with self.assertRaises(gateway.Unavailable):
+            gw.generate('p')              # three failed attempts open the circuit
+        self.assertEqual(gw.breaker.state, gateway.CircuitBreaker.OPEN)
+
+        with self.assertRaises(gateway.Unavailable):
+            gw.generate('p')
+        self.assertEqual(backend.calls, 3)
+        self.assertEqual(gw.stats()['short_circuited'], 1)
+
+        clock.now = 31
+        self.assertEqual(gw.breaker.state, gateway.CircuitBreaker.HALF_OPEN)
+        self.assertTrue(gw.breaker.allow())
+        self.assertFalse(gw.breaker.allow())        # only one probe at a time
+        gw.breaker.release()
+
+        self.assertEqual(gw.generate('p'), 'ok')    # the probe succeeds and closes the circuit
+        self.assertEqual(gw.breaker.state, gateway.CircuitBreaker.CLOSED)
+
+    def test_failed_probe_reopens_the_circuit(self):
+        breaker = gateway.CircuitBreaker(1, 30.0, clock=FakeClock())
+        breaker.record_failure()
+        breaker.clock.now = 31
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, gateway.CircuitBreaker.OPEN)
+
+    def test_concurrent_identical_calls_are_coalesced(self):
+        release = threading.Event()
+        backend = FakeBackend('shared', release=release)
+        gw      = gateway.Gateway(backend)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(gw.generate('same  prompt'))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while len(gw.flight._calls) == 0:
+            threading.Event().wait(0.01)
+        threading.Event().wait(0.1)                 # let the followers join the flight
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['shared'] * 5)
+        self.assertEqual(backend.calls, 1)
+        self.assertEqual(gw.stats()['coalesced'], 4)
+
+    def test_concurrent_identical_async_calls_are_coalesced(self):
+        backend = FakeBackend('shared', delay=0.05)
+        gw      = gateway.Gateway(backend)
+
+        async def burst():
+            return await asyncio.gather(*(gw.agenerate('same prompt') for _ in range(5)))
+
+        self.assertEqual(asyncio.run(burst()), ['shared'] * 5)
+        self.assertEqual(backend.calls, 1)
+        self.assertEqual(gw.stats()['coalesced'], 4)
+
+    def test_stream_rejection_before_the_first_chunk_is_unavailable(self):
+        gw = gateway.Gateway(FakeBackend(Upstream400()))
+        with self.assertRaises(gateway.Unavailable):
+            list(gw.stream('p'))
+
+
+@override_settings(CIRCULAR_LLM_RATE=None, CIRCULAR_LLM_RETRIES=1, CIRCULAR_LLM_BACKOFF=0)
+class TemplateFallbackTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(patch.object(pipeline.llm, 'is_demo', return_value=False))
+
+    def use_backend(self, *outcomes):
+        gw = gateway.Gateway(FakeBackend(*outcomes))
+        self.enterContext(patch.object(gateway, 'get_gateway', return_value=gw))
+
+    def test_generate_text_falls_back_when_gemini_is_unavailable(self):
+        self.use_backend(TimeoutError(), TimeoutError())
+        prompt = pipeline.build_prompt(INPUTS)
+        self.assertEqual(pipeline.generate_text(INPUTS, prompt), pipeline.template_text(INPUTS))
+
+    def test_generate_text_falls_back_when_gemini_rejects_the_prompt(self):
+        self.use_backend(ValueError('blocked'))
+        prompt = pipeline.build_prompt(INPUTS)
+        self.assertEqual(pipeline.generate_text(INPUTS, prompt), pipeline.template_text(INPUTS))
+
+    def test_agenerate_text_falls_back_when_gemini_is_unavailable(self):
+        self.use_backend(Upstream5xx(), Upstream5xx())
+        prompt = pipeline.build_prompt(INPUTS)
+        text   = asyncio.run(pipeline.agenerate_text(INPUTS, prompt, use_cache=False))
+        self.assertEqual(text, pipeline.template_text(INPUTS))
+
+    def test_stream_text_falls_back_when_gemini_is_unavailable(self):
+        self.use_backend(Upstream5xx())
+        prompt = pipeline.build_prompt(INPUTS)
+        self.assertEqual(''.join(pipeline.stream_text(INPUTS, prompt, use_cache=False)), pipeline.template_text(INPUTS))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Archive index
+# ─────────────────────────────────────────────────────────────────────────────
+class ArchiveIndexTests(TransactionTestCase):
+
+    def save(self, circular_id, text):
+        return pipeline.save_circular({**INPUTS, 'subject': f'Notice {circular_id}'}, text, circular_id)
+
+    def ids(self, query):
+        return [result['circular_id'] for result in archive.search(query)[:10]]
+
+    def test_index_follows_edits_and_deletes(self):
+        first = self.save('ARCH0001', 'Seminar on compilers')
+        self.save('ARCH0002', 'Seminar on databases')
+        self.assertEqual(sorted(self.ids('seminar')), ['ARCH0001', 'ARCH0002'])
+
+        pipeline.apply_edits(first, {}, 'Workshop on compilers')
+        self.assertEqual(self.ids('seminar'), ['ARCH0002'])
+        self.assertEqual(self.ids('workshop'), ['ARCH0001'])
+
+        first.delete()
+        self.assertEqual(self.ids('compilers'), [])
+        self.assertEqual(self.ids('databases'), ['ARCH0002'])
+
+    def test_table_rebuild_is_repaired(self):
+        self.addCleanup(archive.ensure_index)
+        self.save('ARCH0001', 'Seminar on compilers')
+        self.save('ARCH0002', 'Seminar on databases')
+        with connection.schema_editor() as editor:
+            editor._remake_table(Circular)      # what SQLite's AlterField does; drops the triggers
+        self.save('ARCH0003', 'Seminar on networks')
+        self.assertNotIn('ARCH0003', self.ids('seminar'))
+
+        self.assertTrue(archive.ensure_index())
+        self.assertFalse(archive.ensure_index())
+        self.assertEqual(sorted(self.ids('seminar')), ['ARCH0001', 'ARCH0002', 'ARCH0003'])
+
+        Circular.objects.filter(pk='ARCH0002').update(text='Lecture on databases')
+        self.assertEqual(self.ids('databases'), ['ARCH0002'])
+        self.assertEqual(sorted(self.ids('seminar')), ['ARCH0001', 'ARCH0003'])
+
+    def test_rank_window_keeps_the_newest_matches(self):
+        for n in range(5):
+            self.save(f'ARCH000{n}', 'Seminar')
+        results = archive.SearchResults('seminar', window=2)
+        self.assertEqual((results.total, results.count()), (5, 2))
+        self.assertEqual(sorted(result['circular_id'] for result in results[:2]), ['ARCH0003', 'ARCH0004'])
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PDF asset resolution
+# ─────────────────────────────────────────────────────────────────────────────
+@override_settings(CIRCULAR_ASSET_OPTIMIZE=False, CIRCULAR_ASSETS_ALLOW_REMOTE=False)
+class AssetResolutionTests(TestCase):
+
+    def test_public_urls_map_to_bundled_files(self):
+        signature = assets.ASSET_DIR / 'signatures' / 'CSE-sign.png'
+        for url in (
+            'http://testserver/static/generator/signatures/CSE-sign.png',
+            'https://raw.githubusercontent.com/adarshaadi06/circulargen/main/generator/static/generator/signatures/CSE-sign.png',
+            '/static/generator/signatures/CSE-sign.png?v=2',
+        ):
+            self.assertEqual(assets.resolve_local_asset(url), signature)
+        self.assertEqual(
+            assets.resolve_local_asset('https://bapujidvg.in/logo/logo.jpg?size=large'),
+            assets.ASSET_DIR / 'img' / 'biet-seal.png',
+        )
+
+    def test_unknown_and_traversing_urls_are_not_resolved(self):
+        for url in (
+            'http://testserver/static/generator/img/missing.png',
+            'http://testserver/static/generator/img/..',
+            'http://testserver/static/generator/img/../../../settings.py',
+            'http://testserver/static/generator/img/%2e%2e%2f%2e%2e%2fmodels.py',
+            'http://testserver/static/admin/css/base.css',
+        ):
+            self.assertIsNone(assets.resolve_local_asset(url), url)
+
+    def test_file_urls_are_confined_to_the_static_assets(self):
+        seal = assets.ASSET_DIR / 'img' / 'biet-seal.png'
+        self.assertEqual(assets.url_fetcher(seal.as_uri())['string'], seal.read_bytes())
+        for path in ('/etc/passwd', f"{assets.ASSET_DIR}/../../models.py", f"{settings.BASE_DIR}/manage.py"):
+            with self.assertRaises(ValueError):
+                assets.url_fetcher(f"file://{path}")
+
+    def test_mapped_remote_urls_are_served_locally(self):
+        result = assets.url_fetcher('https://img.jagranjosh.com/images/2022/June/362022/BIET.png')
+        self.assertEqual(result['string'], (assets.ASSET_DIR / 'img' / 'BIET.png').read_bytes())
+        self.assertEqual(result['mime_type'], 'image/png')
+
+    def test_other_remote_urls_are_refused(self):
+        with patch.object(assets, 'fetch_remote') as fetch:
+            with self.assertRaises(ValueError):
+                assets.url_fetcher('https://example.com/tracker.png')
+            fetch.assert_not_called()
+
+    def test_other_remote_urls_are_fetched_when_allowed(self):
+        with override_settings(CIRCULAR_ASSETS_ALLOW_REMOTE=True), \
+                patch.object(assets, 'fetch_remote', return_value=b'remote') as fetch:
+            result = assets.url_fetcher('https://example.com/logo.png')
+        fetch.assert_called_once_with('https://example.com/logo.png')
+        self.assertEqual((result['string'], result['mime_type']), (b'remote', 'image/png'))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Gemini client (async calls)
+# ─────────────────────────────────────────────────────────────────────────────
+class FakeModel:
+
+    def __init__(self):
+        self.calls = []
+
+    def generate_content(self, prompt, request_options=None):
+        self.calls.append(('sync', threading.current_thread() is threading.main_thread()))
+        return SimpleNamespace(text=f'sync {prompt}')
+
+    async def generate_content_async(self, prompt, request_options=None):
+        self.calls.append(('async', threading.current_thread() is threading.main_thread()))
+        return SimpleNamespace(text=f'async {prompt}')
+
+
+class AsyncGeminiTests(TestCase):
+
+    def setUp(self):
+        self.model = FakeModel()
+        self.enterContext(patch.object(llm, '_model', self.model))
+        self.enterContext(patch.object(llm, '_async_loop', None))
+
+    def test_without_asgi_the_blocking_call_runs_on_a_thread(self):
+        self.assertEqual(asyncio.run(llm.agenerate('hello')), 'sync hello')
+        self.assertEqual(self.model.calls, [('sync', False)])
+        self.assertIsNone(llm._async_loop)
+
+    def test_under_asgi_only_the_server_loop_uses_the_async_client(self):
+        with patch.object(llm, 'native_async', True):
+            self.assertEqual(asyncio.run(llm.agenerate('first')), 'async first')
+            self.assertEqual(asyncio.run(llm.agenerate('second')), 'sync second')
+        self.assertEqual(self.model.calls, [('async', True), ('sync', False)])
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Gemini response cache
+# ─────────────────────────────────────────────────────────────────────────────
+class LLMCacheTests(TestCase):
+
+    MODEL = 'test-model'
+
+    def setUp(self):
+        self.clock  = FakeClock()
+        self.memory = llm_cache.MemoryLRU(3, llm_cache.CACHE_TTL)
+        self.enterContext(patch.object(llm_cache.time, 'monotonic', self.clock))
+        self.enterContext(patch.object(llm_cache, 'memory', self.memory))
+        self.enterContext(patch.dict(llm_cache._stats, {name: 0 for name in llm_cache._stats}))
+
+    def counts(self):
+        stats = llm_cache.stats()
+        return {name: stats[name] for name in ('hits', 'memory_hits', 'store_hits', 'misses', 'bypassed')}
+
+    def test_whitespace_and_unicode_form_do_not_change_the_key(self):
+        key = llm_cache.cache_key(self.MODEL, 'Subject: Caf\u00e9 day\nVenue: Hall A')
+        for prompt in (
+            '  Subject:  Caf\u00e9\tday  \r\nVenue: Hall A\n\n',
+            'Subject: Cafe\u0301 day\nVenue: Hall A',
+        ):
+            self.assertEqual(llm_cache.cache_key(self.MODEL, prompt), key)
+        self.assertNotEqual(llm_cache.cache_key(self.MODEL, 'Subject: Caf\u00e9 day\nVenue: Hall B'), key)
+        self.assertNotEqual(llm_cache.cache_key('other-model', 'Subject: Caf\u00e9 day\nVenue: Hall A'), key)
+
+    def test_memory_hit_then_store_hit(self):
+        llm_cache.put(self.MODEL, 'prompt', 'text')
+        self.assertEqual(llm_cache.get(self.MODEL, 'prompt'), 'text')
+        self.memory.clear()                         # as in another process
+        self.assertEqual(llm_cache.get(self.MODEL, 'prompt'), 'text')
+        self.assertEqual(llm_cache.get(self.MODEL, 'prompt'), 'text')
+        self.assertIsNone(llm_cache.get(self.MODEL, 'other prompt'))
+        self.assertEqual(self.counts(), {'hits': 3, 'memory_hits': 2, 'store_hits': 1, 'misses': 1, 'bypassed': 0})
+
+    def test_memory_entries_expire(self):
+        self.memory.put('key', 'text', ttl=10)
+        self.clock.now = 9
+        self.assertEqual(self.memory.get('key'), 'text')
+        self.clock.now = 11
+        self.assertIsNone(self.memory.get('key'))
+        self.assertEqual(len(self.memory), 0)
+
+    def test_stored_entries_expire(self):
+        llm_cache.put(self.MODEL, 'prompt', 'text')
+        age = timedelta(seconds=llm_cache.CACHE_TTL - 10)
+        LLMResponse.objects.update(created_at=timezone.now() - age)
+        self.memory.clear()
+
+        # Promoted to memory only for the ten seconds it has left.
+        self.assertEqual(llm_cache.get(self.MODEL, 'prompt'), 'text')
+        self.clock.now = 11
+        self.assertIsNone(self.memory.get(llm_cache.cache_key(self.MODEL, 'prompt')))
+
+        LLMResponse.objects.update(created_at=timezone.now() - age - timedelta(seconds=11))
+        self.assertIsNone(llm_cache.get(self.MODEL, 'prompt'))
+        self.assertEqual(llm_cache.purge_expired(), 1)
+        self.assertFalse(LLMResponse.objects.exists())
+
+    def test_least_recently_used_entry_is_evicted(self):
+        for key in ('a', 'b', 'c'):
+            self.memory.put(key, key)
+        self.memory.get('a')
+        self.memory.put('d', 'd')
+        self.assertIsNone(self.memory.get('b'))
+        self.assertEqual([self.memory.get(key) for key in ('a', 'c', 'd')], ['a', 'c', 'd'])
+
+    def test_bypass_skips_the_read_but_refreshes_the_entry(self):
+        llm_cache.put(self.MODEL, 'prompt', 'old')
+        self.assertEqual(llm_cache.get_or_generate(self.MODEL, 'prompt', lambda: 'new', bypass=True), 'new')
+        self.assertEqual(llm_cache.get_or_generate(self.MODEL, 'prompt', lambda: 'unused'), 'new')
+        self.memory.clear()
+        self.assertEqual(llm_cache.get(self.MODEL, 'prompt'), 'new')
+        self.assertEqual(self.counts()['bypassed'], 1)
+
+    @override_settings(CIRCULAR_LLM_CACHE_ENABLED=False)
+    def test_disabled_cache_is_neither_read_nor_written(self):
+        self.assertEqual(llm_cache.get_or_generate(self.MODEL, 'prompt', lambda: 'text'), 'text')
+        self.assertFalse(LLMResponse.objects.exists())
+        self.assertEqual(len(self.memory), 0)
+
+    def test_invalidate_and_clear(self):
+        llm_cache.put(self.MODEL, 'one', 'text 1')
+        llm_cache.put(self.MODEL, 'two', 'text 2')
+        llm_cache.invalidate(self.MODEL, 'one')
+        self.assertIsNone(llm_cache.get(self.MODEL, 'one'))
+        self.assertEqual(llm_cache.get(self.MODEL, 'two'), 'text 2')
+
+        self.assertEqual(llm_cache.clear(), 1)
+        self.assertIsNone(llm_cache.get(self.MODEL, 'two'))
+        self.assertEqual(llm_cache.stats()['memory_entries'], 0)
+
+
+class AsyncLLMCacheTests(TransactionTestCase):
+
+    def test_async_lookup_and_bypass(self):
+        async def generate():
+            return 'fresh'
+
+        self.enterContext(patch.object(llm_cache, 'memory', llm_cache.MemoryLRU(3, llm_cache.CACHE_TTL)))
+        llm_cache.put('test-model', 'prompt', 'cached')
+        llm_cache.memory.clear()
+        self.assertEqual(asyncio.run(llm_cache.aget_or_generate('test-model', 'prompt', generate)), 'cached')
+        self.assertEqual(asyncio.run(llm_cache.aget_or_generate('test-model', 'prompt', generate, bypass=True)), 'fresh')
+        self.assertEqual(llm_cache.get('test-model', 'prompt'), 'fresh')
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Batch generation
+# ─────────────────────────────────────────────────────────────────────────────
+SPEC_FIELDS = ('subject', 'date', 'audience', 'urgency', 'agenda', 'venue', 'event_datetime', 'department')
+
+
+class ParseSpecsTests(TestCase):
+
+    def test_csv(self):
+        data  = (','.join(SPEC_FIELDS) + '\n' + ','.join(f'"{INPUTS[f]}"' for f in SPEC_FIELDS) + '\n').encode('utf-8-sig')
+        specs = batch.parse_specs(data, 'specs.csv')
+        self.assertEqual(specs, [{field: INPUTS[field] for field in SPEC_FIELDS}])
+
+    def test_json_list_and_object(self):
+        spec = {field: INPUTS[field] for field in SPEC_FIELDS}
+        self.assertEqual(batch.parse_specs(json.dumps([spec]).encode(), 'specs.json'), [spec])
+        self.assertEqual(batch.parse_specs(json.dumps({'circulars': [spec, spec]}).encode()), [spec, spec])
+
+    def test_departments_are_expanded(self):
+        specs = batch.expand_departments([
+            {'subject': 'A', 'department': 'all'},
+            {'subject': 'B', 'department': 'cse, ece'},
+            {'subject': 'C'},
+        ])
+        self.assertEqual(
+            [(spec['subject'], spec['department']) for spec in specs],
+            [('A', code) for code in pipeline.HOD_BY_DEPT] + [('B', 'CSE'), ('B', 'ECE'), ('C', '')],
+        )
+
+    def test_unreadable_files_raise_value_error(self):
+        for data, name in ((b'\xff\xfe\x00binary', 'specs.csv'), (b'[{"subject": ', 'specs.json'), (b'[1, 2]', 'specs.json')):
+            with self.assertRaises(ValueError):
+                batch.parse_specs(data, name)
+
+
+def fake_pdf(context, base_url=None):
+    future = Future()
+    future.set_result(f"%PDF {context['subject']}".encode())
+    return future
+
+
+@override_settings(CIRCULAR_DEMO_LLM_LATENCY=0)
+class BatchZipTests(TransactionTestCase):
+
+    SPECS = [
+        {**{field: INPUTS[field] for field in SPEC_FIELDS}, 'subject': 'Exam Notice', 'department': 'CSE,ECE'},
+        {field: INPUTS[field] for field in SPEC_FIELDS if field != 'subject'},
+    ]
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.enterContext(override_settings(CIRCULAR_PDF_ROOT=root))
+        self.enterContext(patch.object(pipeline.llm, 'is_demo', return_value=True))
+        self.enterContext(patch.object(batch, 'submit_pdf', fake_pdf))
+
+    def check_archive(self, data):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive_file:
+            names    = archive_file.namelist()
+            manifest = json.loads(archive_file.read('manifest.json'))
+            self.assertEqual(archive_file.read('001_CSE_Exam_Notice.pdf'), b'%PDF Exam Notice')
+
+        self.assertEqual(sorted(names), ['001_CSE_Exam_Notice.pdf', '002_ECE_Exam_Notice.pdf', 'manifest.json'])
+        self.assertEqual(names[-1], 'manifest.json')
+        self.assertEqual([entry['index'] for entry in manifest], [1, 2, 3])
+        self.assertEqual([entry['status'] for entry in manifest], ['ok', 'ok', 'failed'])
+        self.assertEqual(manifest[0]['filename'], '001_CSE_Exam_Notice.pdf')
+        self.assertEqual(manifest[2]['error'], "Missing field 'subject'")
+        self.assertNotIn('filename', manifest[2])
+        self.assertEqual(Circular.objects.count(), 2)
+
+    def test_zip_members_and_manifest(self):
+        specs = batch.expand_departments(self.SPECS)
+        self.check_archive(b''.join(batch.stream_zip(batch.run_batch(specs))))
+
+    async def test_zip_is_streamed_asynchronously_under_asgi(self):
+        user   = await User.objects.acreate(username='batcher')
+        client = AsyncClient()
+        await client.aforce_login(user)
+        upload = io.BytesIO(json.dumps(self.SPECS).encode())
+        upload.name = 'specs.json'
+
+        response = await client.post(reverse('batch_circulars'), {'specs': upload})
+        self.assertTrue(response.is_async)
+        data = b''.join([chunk async for chunk in response.streaming_content])
+        await sync_to_async(self.check_archive)(data)
+
+    async def test_bad_spec_file_is_rejected(self):
+        user   = await User.objects.acreate(username='batcher')
+        client = AsyncClient()
+        await client.aforce_login(user)
+        upload = io.BytesIO(b'{"circulars": 5}')
+        upload.name = 'specs.json'
+
+        response = await client.post(reverse('batch_circulars'), {'specs': upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b'Could not read spec file', response.content)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Server-Timing and /metrics
+# ─────────────────────────────────────────────────────────────────────────────
+def timing_names(response):
+    return [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+
+
+class ServerTimingTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='timer')
+
+    def test_sync_request_lists_its_spans(self):
+        client = Client()
+        client.force_login(self.user)
+        pipeline.save_circular(INPUTS, 'Body', 'TIME0001')
+
+        response = client.post(reverse('edit_circular', args=['TIME0001']), {'venue': 'Hall B'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(timing_names(response), ['persist', 'template_render', 'total'])
+        self.assertRegex(response['Server-Timing'], r'^persist;dur=\d+\.\d, template_render;dur=\d+\.\d, total;dur=\d+\.\d$')
+
+    @override_settings(CIRCULAR_DEMO_LLM_LATENCY=0)
+    async def test_async_request_lists_its_spans(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        with patch.object(pipeline.llm, 'is_demo', return_value=True):
+            response = await client.post(reverse('generate_circular'), INPUTS)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(timing_names(response), ['prompt_build', 'llm', 'persist', 'template_render', 'total'])
+
+    async def test_async_requests_still_require_login(self):
+        response = await AsyncClient().post(reverse('generate_circular'), INPUTS)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('?next=', response['Location'])
+        self.assertIn('total', timing_names(response))
+
+
+class AsyncMiddlewareTests(TestCase):
+
+    @staticmethod
+    async def view(request):
+        with span('llm'):
+            return HttpResponse('ok')
+
+    def test_login_check_awaits_the_user(self):
+        middleware = LoginRequiredMiddleware(self.view)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        # request.user is left unset: the async branch must only use auser().
+        request       = RequestFactory().get('/circulars/')
+        request.auser = sync_to_async(AnonymousUser)
+        response      = asyncio.run(middleware(request))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], f"{reverse('admin:login')}?next=/circulars/")
+
+    def test_timing_header_is_added_to_async_responses(self):
+        middleware = ServerTimingMiddleware(self.view)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        response = asyncio.run(middleware(RequestFactory().get('/')))
+        self.assertEqual(response.content, b'ok')
+        self.assertEqual(timing_names(response), ['llm', 'total'])
+
+
+class MetricsTests(TestCase):
+
+    SAMPLE = re.compile(r'^[a-z_]+(\{[^}]*\})? -?[0-9.e+-]+$|^[a-z_]+(\{[^}]*\})? [+-]?Inf$')
+
+    def test_metrics_are_served_without_login_in_prometheus_format(self):
+        with override_settings(CIRCULAR_LLM_RATE=None):
+            gw = gateway.Gateway(FakeBackend())
+            gw.generate('prompt')
+        with patch.object(gateway, 'get_gateway', return_value=gw), \
+                patch.dict(llm_cache._stats, {'hits': 3, 'misses': 2}):
+            response = Client().get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        lines = response.content.decode().splitlines()
+        for line in lines:
+            if not line.startswith('#'):
+                self.assertRegex(line, self.SAMPLE)
+        self.assertIn('# TYPE circular_stage_duration_seconds histogram', lines)
+        self.assertIn('# TYPE circular_llm_cache_hits_total counter', lines)
+        self.assertIn('circular_llm_cache_hits_total 3', lines)
+        self.assertIn('circular_llm_cache_misses_total 2', lines)
+        self.assertIn('circular_llm_gateway_calls_total 1', lines)
+        self.assertIn('circular_llm_circuit_open 0', lines)
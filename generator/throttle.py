@@ -0,0 +1,79 @@
+# generator/throttle.py
+"""Thread-safe token bucket used to keep bursts of outgoing calls under a rate limit."""
+
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Allow ``rate`` operations per second on average, with bursts of up to
+    ``capacity``. A ``rate`` of ``None`` or ``0`` disables throttling.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate     = rate
+        self.capacity = max(capacity, 1)
+        self._tokens  = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock    = threading.Lock()
+
+    def _refill(self):
+        now           = time.monotonic()
+        self._tokens  = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available; never blocks."""
+        if not self.rate:
+            return True
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def _take(self):
+        """Take a token and return 0, or return how long until one is available."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def _wait(self, deadline):
+        """Seconds to sleep before trying again, or ``None`` once past ``deadline``."""
+        wait = self._take()
+        if not wait:
+            return 0
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            wait = min(wait, remaining)
+        return wait
+
+    def acquire(self, timeout=None):
+        """Block until a token is available. Returns ``False`` on timeout."""
+        if not self.rate:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while (wait := self._wait(deadline)) != 0:
+            if wait is None:
+                return False
+            time.sleep(wait)
+        return True
+
+    async def aacquire(self, timeout=None):
+        """``acquire`` for coroutines: waits with ``asyncio.sleep`` instead of blocking."""
+        if not self.rate:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while (wait := self._wait(deadline)) != 0:
+            if wait is None:
+                return False
+            await asyncio.sleep(wait)
+        return True
@@ -5,7 +5,21 @@ from generator import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('generate_circular/', views.generate_circular, name='generate_circular'),
+    path('generate_circular/stream/', views.generate_circular_stream, name='generate_circular_stream'),
+    path('generate_circular/events/', views.circular_events, name='circular_events'),
     path('send-email/', views.send_email, name='send_email'),
+    path('circular/<str:circular_id>/pdf/', views.circular_pdf, name='circular_pdf'),
+    path('circular/<str:circular_id>/edit/', views.edit_circular, name='edit_circular'),
+    path('distributions/<int:distribution_id>/', views.distribution_detail, name='distribution_detail'),
+    path('distributions/<int:distribution_id>/status/', views.distribution_status, name='distribution_status'),
+    path('distributions/<int:distribution_id>/retry/', views.retry_distribution, name='retry_distribution'),
+    path('jobs/', views.submit_circular, name='submit_circular'),
+    path('jobs/<str:job_id>/', views.circular_job_status, name='circular_job_status'),
+    path('jobs/<str:job_id>/result/', views.circular_job_result, name='circular_job_result'),
+    path('batch/', views.batch_circulars, name='batch_circulars'),
+    path('archive/', views.archive_search, name='archive_search'),
+    path('archive/search.json', views.archive_search_api, name='archive_search_api'),
+    path('metrics', views.metrics, name='metrics'),
     # path('send-email/', views.send_email, name='send_email'),
 
 ]
@@ -1,71 +1,27 @@
 # generator/views.py
 
-import os
-import re
 import uuid
 
-from django.shortcuts       import render, redirect
-from django.http            import HttpResponse
-from django.template.loader import render_to_string
-from django.conf            import settings
+from asgiref.sync           import sync_to_async
+from django.shortcuts       import render, redirect, get_object_or_404, aget_object_or_404
+from django.http            import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls            import reverse
 from django.contrib         import messages
 from django.contrib.auth    import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.core.mail       import EmailMessage
-
-import google.generativeai as genai
-from weasyprint import HTML
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 1. HOD Mapping by Department Code
-# ─────────────────────────────────────────────────────────────────────────────
-HOD_BY_DEPT = {
-    'CSE':   'Dr. Nirmala C R',
-    'MECH':  'Dr. G. Manavendra',
-    'CIVIL': 'Dr. Chidananda G',
-    'EEE':   'Dr. M S Nagaraj',
-    'ECE':   'Dr. G.S. Sunitha',
-    'ISE':   'Dr. Poornima B',
-}
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 1b. Department full-name mapping
-# ─────────────────────────────────────────────────────────────────────────────
-DEPT_FULL_BY_CODE = {
-    'CSE':   'Computer Science and Engineering',
-    'MECH':  'Mechanical Engineering',
-    'CIVIL': 'Civil Engineering',
-    'EEE':   'Electrical & Electronics Engineering',
-    'ECE':   'Electronics & Communication Engineering',
-    'ISE':   'Information Science & Engineering',
-}
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 2. Signature URLs on GitHub (raw)
-# ─────────────────────────────────────────────────────────────────────────────
-GITHUB_RAW_BASE = (
-    "https://raw.githubusercontent.com/adarshaadi06/circulargen"
-    "/main/generator/static/generator/signatures"
-)
-
-HOD_SIG_URLS = {
-    'CSE':   "https://github.com/adarshaadi06/circulargen/blob/main/generator/static/generator/signatures/CSE-sign.png?raw=true",
-    'MECH':  "https://raw.githubusercontent.com/adarshaadi06/circulargen/main/generator/static/generator/signatures/MECH-sign.png?raw=true",
-    'CIVIL': "https://raw.githubusercontent.com/adarshaadi06/circulargen/main/generator/static/generator/signatures/CIVIL-sign.png?raw=true",
-    'EEE':   "https://raw.githubusercontent.com/adarshaadi06/circulargen/main/generator/static/generator/signatures/EEE-sign.png?raw=true",
-    # 'ECE':   "https://github.com/adarshaadi06/circulargen/blob/main/generator/static/generator/signatures/ECE-sign.png?raw=true",
-    # 'ISE':   "https://github.com/adarshaadi06/circulargen/blob/main/generator/static/generator/signatures/ISE-sign.png?raw=true",
-}
+from django.core            import signing
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator  import Paginator
+from django.conf            import settings
+from django.utils.cache     import get_conditional_response
+from django.utils.http      import http_date, quote_etag
 
-DIRECTOR_SIG_URL   = f"{GITHUB_RAW_BASE}/director-sign.png?raw=true"
-PRINCIPAL_SIG_URL  = f"{GITHUB_RAW_BASE}/principal-sign.png?raw=true"
+from generator        import archive, batch, distribution, gateway, jobs, llm_cache, pipeline, storage, streaming
+from generator.instrumentation import render_metrics, span
+from generator.models import Circular, CircularJob, Distribution
 
-# ─────────────────────────────────────────────────────────────────────────────
-# 3. Configure Google Gemini AI (if API key present)
-# ─────────────────────────────────────────────────────────────────────────────
-api_key = getattr(settings, 'GOOGLE_API_KEY', os.environ.get("GOOGLE_API_KEY"))
-if api_key:
-    genai.configure(api_key=api_key)
+# Sections 1–3 (department mappings, signature URLs, Gemini setup) live in
+# generator/pipeline.py alongside the generation stages that use them.
 
 # ─────────────────────────────────────────────────────────────────────────────
 # 4. Authentication Views
@@ -101,123 +57,299 @@ def index(request):
 
 
 @login_required
-def generate_circular(request):
+async def generate_circular(request):
+    # Async so that a request waiting on Gemini holds no thread; database work
+    # and template rendering (which reads the session) run via sync_to_async.
     if request.method != 'POST':
         return HttpResponse("Invalid request method", status=400)
 
     # --- 5.1 Collect form inputs ---
-    subject         = request.POST['subject']
-    date            = request.POST['date']
-    audience        = request.POST['audience']
-    urgency         = request.POST['urgency']
-    agenda          = request.POST['agenda']
-    additional_info = request.POST['additional_info']
-    venue           = request.POST.get('venue', '')
-    event_datetime  = request.POST.get('event_datetime', '')
-    department      = request.POST['department']
-    recipient_email = request.POST['recipient_email']
-
-    # --- 5.2 HOD name, dept full-name & signature URL ---
-    hod_name           = HOD_BY_DEPT.get(department, 'Head of Department')
-    dept_full          = DEPT_FULL_BY_CODE.get(department, department)
-    hod_signature_url  = HOD_SIG_URLS.get(department, '')
-
-    # --- 5.3 Build AI prompt & generate circular text ---
-    prompt = (
-        "Write a formal and concise college circular in one paragraph, "
-        "no bullets in body. Keep Subject on its own line before details. "
-        "After, list Venue, Date, Time as bullets. Do NOT include signatures.\n\n"
-        f"Subject: {subject}\n"
-        f"Audience: {audience}\n"
-        f"Urgency: {urgency}\n"
-        f"Agenda: {agenda}\n"
-        f"Details: {additional_info}\n\n"
-        f"* Venue: {venue}\n"
-        f"* Date: {event_datetime.split(',')[0] if ',' in event_datetime else event_datetime}\n"
-        f"* Time: {event_datetime.split(',')[-1].strip() if ',' in event_datetime else ''}\n\n"
-        "Circular Content:\n"
-    )
-
-    if api_key == 'DEMO-API-KEY':
-        circular = (
-            f"Subject: {subject}\n"
-            f"This is a simulated circular for {audience} about '{agenda}'. "
-            f"Details: {additional_info}.\n"
-            f"* Venue: {venue}\n"
-            f"* Date: {event_datetime.split(',')[0]}\n"
-            f"* Time: {event_datetime.split(',')[-1].strip()}\n"
-        )
-    else:
-        model    = genai.GenerativeModel('gemini-1.5-pro-latest')
-        response = model.generate_content(prompt)
-        circular = re.sub(r'\*\*(.*?)\*\*', r'\1', response.text)
+    inputs = pipeline.collect_inputs(request.POST)
 
-    # --- 5.4 Generate unique Circular ID ---
+    # --- 5.2 Generate unique Circular ID ---
     circular_id = uuid.uuid4().hex[:8].upper()
 
-    # --- 5.5 Build template context ---
-    context = {
-        'subject':                subject,
-        'audience':               audience,
-        'urgency':                urgency,
-        'agenda':                 agenda,
-        'additional_info':        additional_info,
-        'venue':                  venue,
-        'event_datetime':         event_datetime,
-        'department':             department,
-        'dept_full':              dept_full,
-        'hod_name':               hod_name,
-        'hod_signature_url':      hod_signature_url,
-        'director_signature_url': DIRECTOR_SIG_URL,
-        'principal_signature_url':PRINCIPAL_SIG_URL,
-        'circular':               circular,
-        'date':                   date,
-        'circular_id':            circular_id,
-        'recipient_email':        recipient_email,
-        'is_pdf':                 False,
+    # --- 5.3 Prompt → AI text → stored circular (see generator/pipeline.py) ---
+    # "regenerate" asks for a fresh draft instead of the cached LLM response.
+    # The PDF is only rendered when it is first downloaded or emailed.
+    use_cache = not request.POST.get('regenerate')
+    context   = await pipeline.arun(inputs, circular_id, use_cache=use_cache)
+
+    # --- 5.4 Return result page ---
+    with span('template_render'):
+        return await sync_to_async(render)(request, 'generator/result.html', context)
+
+
+@login_required
+async def send_email(request):
+    if request.method != 'POST':
+        return HttpResponse("Invalid request method", status=400)
+
+    circular   = await aget_object_or_404(Circular, pk=request.POST['circular_id'])
+    raw        = request.POST['recipient_email']
+    recipients = [e.strip() for e in raw.split(',') if e.strip()]
+
+    # Sending happens on the background pool; the status page follows progress.
+    dist = await sync_to_async(distribution.create)(circular, circular.subject, recipients)
+    await sync_to_async(distribution.submit)(dist)
+    return redirect('distribution_detail', dist.pk)
+
+
+def _pdf_etag(circular):
+    return quote_etag(pipeline.context_hash(pipeline.circular_context(circular)))
+
+
+@login_required
+async def circular_pdf(request, circular_id):
+    # The ETag is the hash of the render context, so conditional requests are
+    # answered without rendering; otherwise the PDF is rendered once and cached.
+    # The render is awaited, so a slow first download doesn't hold a worker thread.
+    circular      = await aget_object_or_404(Circular, pk=circular_id)
+    etag          = await sync_to_async(_pdf_etag)(circular)
+    last_modified = int(circular.updated_at.timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        digest = await pipeline.aensure_pdf(circular, request.build_absolute_uri('/'))
+        try:
+            pdf_file = await sync_to_async(storage.object_path(digest).open)('rb')
+        except FileNotFoundError:
+            raise Http404("PDF not found.")
+        response = FileResponse(pdf_file, content_type='application/pdf', filename=circular.pdf_filename)
+
+    if request.method in ('GET', 'HEAD'):
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(last_modified))
+    return response
+
+
+@login_required
+def distribution_detail(request, distribution_id):
+    dist = get_object_or_404(Distribution, pk=distribution_id)
+    return render(request, 'generator/email_status.html', {
+        'distribution': dist,
+        'deliveries':   dist.deliveries.all(),
+        'counts':       distribution.progress(dist),
+        'status':       {'sent': 'success', 'failed': 'failed'}.get(dist.status, dist.status),
+    })
+
+
+@login_required
+def distribution_status(request, distribution_id):
+    dist = get_object_or_404(Distribution, pk=distribution_id)
+    return JsonResponse({
+        'id':         dist.pk,
+        'status':     dist.status,
+        'counts':     distribution.progress(dist),
+        'deliveries': list(dist.deliveries.values('recipient', 'status', 'error', 'attempts')),
+    })
+
+
+@login_required
+def retry_distribution(request, distribution_id):
+    if request.method != 'POST':
+        return HttpResponse("Invalid request method", status=400)
+
+    dist = get_object_or_404(Distribution, pk=distribution_id)
+    distribution.submit(dist)
+    return redirect('distribution_detail', dist.pk)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 6. Background generation jobs
+# ─────────────────────────────────────────────────────────────────────────────
+def _job_payload(job):
+    payload = {
+        'job_id':     job.pk,
+        'status':     job.status,
+        'status_url': reverse('circular_job_status', args=[job.pk]),
     }
+    if job.status == CircularJob.DONE:
+        payload['result_url'] = reverse('circular_job_result', args=[job.pk])
+    if job.status == CircularJob.FAILED:
+        payload['error'] = job.error
+    return payload
+
+
+@login_required
+def submit_circular(request):
+    if request.method != 'POST':
+        return HttpResponse("Invalid request method", status=400)
 
-    # --- 5.6 Render PDF bytes ---
-    html_string = render_to_string(
-        'generator/result.html', {**context, 'is_pdf': True}
+    job = jobs.submit(
+        pipeline.collect_inputs(request.POST),
+        request.build_absolute_uri('/'),
+        use_cache=not request.POST.get('regenerate'),
     )
-    base_url  = request.build_absolute_uri('/')
-    pdf_bytes = HTML(string=html_string, base_url=base_url).write_pdf()
+    return JsonResponse(_job_payload(job), status=202)
+
+
+@login_required
+def circular_job_status(request, job_id):
+    job = get_object_or_404(CircularJob, pk=job_id)
+    return JsonResponse(_job_payload(job))
+
+
+@login_required
+def circular_job_result(request, job_id):
+    job = get_object_or_404(CircularJob, pk=job_id)
+    if job.status != CircularJob.DONE:
+        return JsonResponse(_job_payload(job), status=409)
+    with span('template_render'):
+        return render(request, 'generator/result.html', job.result)
 
-    # --- 5.7 Save PDF to disk ---
-    pdf_dir  = os.path.join(settings.BASE_DIR, 'generated_pdfs')
-    os.makedirs(pdf_dir, exist_ok=True)
-    pdf_name = f"circular_{subject.replace(' ', '_')}.pdf"
-    pdf_path = os.path.join(pdf_dir, pdf_name)
-    with open(pdf_path, 'wb') as f:
-        f.write(pdf_bytes)
 
-    # --- 5.8 Return result page ---
-    context['pdf_filename'] = pdf_name
-    return render(request, 'generator/result.html', context)
+# ─────────────────────────────────────────────────────────────────────────────
+# 7. Batch generation
+# ─────────────────────────────────────────────────────────────────────────────
+@login_required
+def batch_circulars(request):
+    if request.method != 'POST':
+        return render(request, 'generator/batch.html')
+
+    upload = request.FILES.get('specs')
+    if upload is None:
+        return HttpResponse("No spec file uploaded.", status=400)
+    try:
+        specs = batch.parse_specs(upload.read(), upload.name)
+    except ValueError as exc:
+        return HttpResponse(f"Could not read spec file: {exc}", status=400)
+
+    results  = batch.run_batch(
+        specs,
+        request.build_absolute_uri('/'),
+        use_cache=not request.POST.get('regenerate'),
+    )
+    body     = batch.stream_zip(results)
+    if isinstance(request, ASGIRequest):
+        # Django's ASGI handler would build the whole ZIP before sending it.
+        body = streaming.aiterate(body)
+    response = StreamingHttpResponse(body, content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="circulars.zip"'
+    return response
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# 8. Streaming generation (Server-Sent Events)
+# ─────────────────────────────────────────────────────────────────────────────
 @login_required
-def send_email(request):
+def generate_circular_stream(request):
     if request.method != 'POST':
         return HttpResponse("Invalid request method", status=400)
 
-    pdf_filename = request.POST['pdf_filename']
-    raw          = request.POST['recipient_email']
-    recipients   = [e.strip() for e in raw.split(',') if e.strip()]
-    subject      = request.POST['subject']
-    pdf_path     = os.path.join(settings.BASE_DIR, 'generated_pdfs', pdf_filename)
+    inputs      = pipeline.collect_inputs(request.POST)
+    circular_id = uuid.uuid4().hex[:8].upper()
+    token       = streaming.make_token(inputs, circular_id, use_cache=not request.POST.get('regenerate'))
+
+    # Render the letterhead straight away; the body fills in from the event stream.
+    context = pipeline.build_context(inputs, '', circular_id)
+    context['streaming']  = True
+    context['events_url'] = f"{reverse('circular_events')}?token={token}"
+    with span('template_render'):
+        return render(request, 'generator/result.html', context)
+
 
-    if not os.path.exists(pdf_path):
-        return HttpResponse("PDF not found.", status=404)
+@login_required
+def circular_events(request):
+    try:
+        payload = streaming.read_token(request.GET.get('token', ''))
+    except signing.BadSignature:
+        return HttpResponse("Invalid or expired stream token.", status=400)
+
+    events = streaming.event_stream(
+        payload['inputs'],
+        payload['circular_id'],
+        request.build_absolute_uri('/'),
+        use_cache=payload['use_cache'],
+    )
+    if isinstance(request, ASGIRequest):
+        # Django's ASGI handler would buffer a sync iterator until it ends.
+        events = streaming.aiterate(events)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control']     = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 9. Metrics (Prometheus text format; not behind login, see middleware)
+# ─────────────────────────────────────────────────────────────────────────────
+def metrics(request):
+    cache_stats   = llm_cache.stats()
+    gateway_stats = gateway.get_gateway().stats()
+    counters      = {
+        f"circular_llm_cache_{name}_total": cache_stats[name]
+        for name in ('hits', 'memory_hits', 'store_hits', 'misses', 'bypassed')
+    }
+    counters.update(
+        (f"circular_llm_gateway_{name}_total", value)
+        for name, value in gateway_stats.items() if name != 'circuit'
+    )
+    gauges = {'circular_llm_circuit_open': int(gateway_stats['circuit'] != 'closed')}
+    return HttpResponse(render_metrics(counters, gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 10. Editing a generated circular (reuses its text; no Gemini call)
+# ─────────────────────────────────────────────────────────────────────────────
+@login_required
+def edit_circular(request, circular_id):
+    circular = get_object_or_404(Circular, pk=circular_id)
+    if request.method != 'POST':
+        return render(request, 'generator/edit.html', {
+            **circular.inputs,
+            'circular':    circular.text,
+            'circular_id': circular.circular_id,
+            'departments': pipeline.DEPT_FULL_BY_CODE,
+        })
 
-    email = EmailMessage(
-        subject=f"Circular: {subject}",
-        body="Dear recipient,\n\nPlease find attached the official circular.\n\nRegards,\nAdmin Office",
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        to=recipients
+    # The preview is re-rendered now; the PDF on its next download.
+    changes = {f: request.POST[f] for f in pipeline.INPUT_FIELDS if f in request.POST}
+    context = pipeline.apply_edits(circular, changes, request.POST.get('circular'))
+    with span('template_render'):
+        return render(request, 'generator/result.html', context)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 11. Archive search (SQLite FTS5, see generator/archive.py)
+# ─────────────────────────────────────────────────────────────────────────────
+def _archive_page(request):
+    query      = request.GET.get('q', '').strip()
+    department = request.GET.get('department', '').strip()
+    paginator  = Paginator(
+        archive.search(query, department),
+        getattr(settings, 'CIRCULAR_ARCHIVE_PAGE_SIZE', 20),
     )
-    email.attach_file(pdf_path)
+    return query, department, paginator.get_page(request.GET.get('page'))
+
+
+@login_required
+def archive_search(request):
+    query, department, page = _archive_page(request)
+    return render(request, 'generator/archive.html', {
+        'query':       query,
+        'department':  department,
+        'departments': pipeline.DEPT_FULL_BY_CODE,
+        'page':        page,
+    })
+
 
-    status = 'success' if email.send() else 'failed'
-    return render(request, 'generator/email_status.html', {'status': status})
+@login_required
+def archive_search_api(request):
+    query, department, page = _archive_page(request)
+    return JsonResponse({
+        'query':      query,
+        'department': department,
+        'count':      page.paginator.object_list.total,
+        'ranked':     page.paginator.count,
+        'page':       page.number,
+        'pages':      page.paginator.num_pages,
+        'results':    [
+            {
+                **result,
+                'pdf_url':  reverse('circular_pdf', args=[result['circular_id']]),
+                'edit_url': reverse('edit_circular', args=[result['circular_id']]),
+            }
+            for result in page
+        ],
+    })